@@ -0,0 +1,25 @@
+import pytest
+from django.test import override_settings
+
+
+@pytest.fixture(autouse=True, scope='session')
+def temporary_media(tmp_path_factory):
+    """Картинки из тестов пишутся во временный каталог, а не в media/."""
+    with override_settings(
+        MEDIA_ROOT=str(tmp_path_factory.mktemp('media')),
+        RESIZE_CACHE_DIR=str(tmp_path_factory.mktemp('resize_cache')),
+    ):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def reset_view_counts():
+    """Просмотры, накопленные тестом, не переходят в следующий тест.
+
+    У каждого теста своя база, а при выходе их записал бы atexit уже
+    в рабочую.
+    """
+    yield
+    from posts import view_counts
+
+    view_counts.reset()
@@ -0,0 +1,224 @@
+"""Пул соединений с базой, общий для потоков одного процесса.
+
+Django держит по соединению на поток и без CONN_MAX_AGE открывает новое
+на каждый запрос. Бэкенд с ``PooledConnectionMixin`` вместо этого берет
+соединение из пула при первом SQL-запросе и возвращает его в конце
+запроса, поэтому процесс держит не больше ``SIZE`` открытых соединений,
+а запросы не тратят время на установку соединения.
+
+Соединение, пролежавшее в пуле дольше ``CHECK_AFTER`` секунд, перед
+выдачей проверяется запросом ``SELECT 1`` и при ошибке заменяется новым.
+Соединения старше ``MAX_AGE`` секунд закрываются при возврате. Если все
+соединения заняты, поток ждет не дольше ``TIMEOUT`` секунд.
+
+Параметры задаются в ``DATABASES[alias]['POOL']``; при ``SIZE = 0`` пул
+выключен и соединения открываются и закрываются как обычно.
+"""
+import collections
+import os
+import threading
+import time
+
+from django.db import connections
+from django.db.utils import OperationalError
+
+from core import metrics
+
+DEFAULTS = {
+    'SIZE': 4,
+    'TIMEOUT': 5.0,
+    'CHECK_AFTER': 30.0,
+    'MAX_AGE': 30 * 60,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(OperationalError):
+    """Все соединения пула заняты дольше TIMEOUT секунд."""
+
+
+class PooledConnection:
+    """Соединение драйвера вместе с временем открытия и возврата в пул."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created = time.monotonic()
+        self.released = self.created
+
+
+def is_alive(connection):
+    """Проверяет соединение драйвера DB-API запросом SELECT 1."""
+    try:
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        finally:
+            cursor.close()
+        return True
+    except Exception:
+        return False
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений драйвера DB-API."""
+
+    def __init__(self, alias, size=DEFAULTS['SIZE'],
+                 timeout=DEFAULTS['TIMEOUT'],
+                 check_after=DEFAULTS['CHECK_AFTER'],
+                 max_age=DEFAULTS['MAX_AGE']):
+        self.alias = alias
+        self.size = size
+        self.timeout = timeout
+        self.check_after = check_after
+        self.max_age = max_age
+        self.idle = collections.deque()
+        self.opened = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, connect):
+        """Свободное соединение из пула или новое, открытое connect()."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self.condition:
+            while not self.idle and self.opened >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    metrics.DB_POOL_TIMEOUTS.inc(database=self.alias)
+                    raise PoolTimeout(
+                        f'Нет свободного соединения с {self.alias} '
+                        f'за {self.timeout} с')
+                self.condition.wait(remaining)
+            # Последнее возвращенное соединение первым уходит в работу,
+            # лишние дольше лежат без дела и раньше проходят проверку.
+            pooled = self.idle.pop() if self.idle else None
+            if pooled is None:
+                self.opened += 1
+        metrics.DB_POOL_WAIT.observe(
+            time.monotonic() - started, database=self.alias)
+        if pooled is not None:
+            idle = time.monotonic() - pooled.released
+            if idle < self.check_after or is_alive(pooled.connection):
+                return pooled
+            metrics.DB_RECONNECTS.inc(database=self.alias)
+            self._close(pooled)
+        try:
+            return PooledConnection(connect())
+        except BaseException:
+            self._forget()
+            raise
+
+    def release(self, pooled, usable=True):
+        """Возвращает соединение в пул; неработающее и старое закрывает."""
+        if not usable or time.monotonic() - pooled.created >= self.max_age:
+            self._close(pooled)
+            self._forget()
+            return
+        pooled.released = time.monotonic()
+        with self.condition:
+            self.idle.append(pooled)
+            self.condition.notify()
+
+    def close_all(self):
+        with self.condition:
+            idle, self.idle = list(self.idle), collections.deque()
+        for pooled in idle:
+            self._close(pooled)
+            self._forget()
+
+    def _close(self, pooled):
+        try:
+            pooled.connection.close()
+        except Exception:
+            pass
+
+    def _forget(self):
+        with self.condition:
+            self.opened -= 1
+            self.condition.notify()
+
+
+def options(settings_dict):
+    return {**DEFAULTS, **settings_dict.get('POOL', {})}
+
+
+def get_pool(wrapper, conn_params):
+    """Пул соединения Django wrapper или None, если пул выключен.
+
+    Пулы хранятся по pid, чтобы воркер после fork не взял соединения,
+    открытые родительским процессом, и по параметрам подключения, чтобы
+    после смены NAME (например, на тестовую базу) не выдавались
+    соединения со старой базой.
+    """
+    params = options(wrapper.settings_dict)
+    if not params['SIZE']:
+        return None
+    key = (os.getpid(), wrapper.alias, repr(sorted(conn_params.items())))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(
+                    wrapper.alias,
+                    size=params['SIZE'],
+                    timeout=params['TIMEOUT'],
+                    check_after=params['CHECK_AFTER'],
+                    max_age=params['MAX_AGE'],
+                )
+    return pool
+
+
+def reset_pools():
+    """Закрывает свободные соединения и забывает пулы процесса."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+def release_connections():
+    """Возвращает соединения потока в пул перед долгим ожиданием.
+
+    Соединения внутри транзакции не трогаются. Следующий SQL-запрос
+    потока снова возьмет соединение из пула.
+    """
+    for connection in connections.all():
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+class PooledConnectionMixin:
+    """Подмешивается к DatabaseWrapper бэкенда Django.
+
+    Соединение берется из пула в get_new_connection и возвращается в пул
+    вместо закрытия. Перед возвратом незавершенная транзакция
+    откатывается; соединение с ошибкой закрывается.
+    """
+
+    def get_new_connection(self, conn_params):
+        pool = get_pool(self, conn_params)
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        self._pool = pool
+        self._pooled = pool.acquire(
+            lambda: super(PooledConnectionMixin, self).get_new_connection(
+                conn_params))
+        return self._pooled.connection
+
+    def _close(self):
+        pooled = getattr(self, '_pooled', None)
+        if pooled is None or pooled.connection is not self.connection:
+            return super()._close()
+        self._pooled = None
+        # Внутри atomic Django оставляет ссылку на соединение, поэтому
+        # отдавать его другому потоку нельзя.
+        usable = not (self.errors_occurred or self.in_atomic_block)
+        if usable:
+            try:
+                self.connection.rollback()
+            except Exception:
+                usable = False
+        self._pool.release(pooled, usable)
@@ -0,0 +1,15 @@
+from django.db.backends.postgresql import base, creation
+
+from ..pool import PooledConnectionMixin, reset_pools
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Свободные соединения пула с тестовой базой не дают ее удалить.
+        reset_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(PooledConnectionMixin, base.DatabaseWrapper):
+    """Бэкенд PostgreSQL с пулом соединений процесса (см. core.db.pool)."""
+    creation_class = DatabaseCreation
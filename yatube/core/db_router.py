@@ -0,0 +1,109 @@
+"""Чтение из реплик базы с закреплением основной базы после записи.
+
+Реплики перечислены в ``settings.DATABASE_REPLICAS``. Из них читают только
+представления с декоратором ``read_from_replica``; все остальные запросы
+и любая запись идут в основную базу. Запись во время запроса отмечается
+в потоке, и ``ReplicaPinningMiddleware`` ставит посетителю cookie, с
+которой его чтения ``REPLICA_PIN_SECONDS`` секунд идут в основную базу:
+так автор сразу видит свой пост, комментарий или подписку, даже если
+реплика еще не догнала основную базу.
+
+Кэш лент строится по версиям, поэтому чтение из отстающей реплики сразу
+после смены версии сохранило бы старые данные под новой версией. Лента,
+измененная меньше ``REPLICA_LAG_SECONDS`` секунд назад, переводит чтения
+запроса в основную базу (``read_primary``). Служебная запись внутри
+читающего представления (миниатюры) оборачивается в ``without_pinning``
+и посетителя за основной базой не закрепляет.
+"""
+import random
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'pin_primary'
+READ_METHODS = ('GET', 'HEAD')
+
+_local = threading.local()
+
+
+def start_request():
+    _local.wrote = False
+
+
+def wrote():
+    return getattr(_local, 'wrote', False)
+
+
+def choose_replica():
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+@contextmanager
+def replica_reads():
+    """Направляет чтения внутри блока в реплики."""
+    previous = getattr(_local, 'replica', False)
+    _local.replica = True
+    try:
+        yield
+    finally:
+        _local.replica = previous
+
+
+def read_primary():
+    """Отправляет оставшиеся чтения запроса в основную базу."""
+    _local.replica = False
+
+
+@contextmanager
+def without_pinning():
+    """Запись внутри блока не закрепляет посетителя за основной базой."""
+    previous = wrote()
+    try:
+        yield
+    finally:
+        _local.wrote = previous
+
+
+def is_pinned(request):
+    return PIN_COOKIE in request.COOKIES
+
+
+def read_from_replica(view):
+    """Декоратор представления, которое только читает данные.
+
+    Посетитель, недавно писавший в базу, читает из основной базы.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (not settings.DATABASE_REPLICAS
+                or request.method not in READ_METHODS
+                or is_pinned(request)):
+            return view(request, *args, **kwargs)
+        with replica_reads():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (getattr(_local, 'replica', False) and not wrote()
+                and settings.DATABASE_REPLICAS):
+            return choose_replica()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _local.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема попадает в реплики вместе с данными через репликацию.
+        return db not in settings.DATABASE_REPLICAS
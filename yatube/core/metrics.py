@@ -0,0 +1,235 @@
+"""Метрики запросов в памяти процесса в текстовом формате Prometheus.
+
+Для каждого представления копятся гистограммы времени ответа, числа
+и времени SQL-запросов и времени отрисовки шаблонов, а также счетчики
+попаданий и промахов кэша. Данные живут в памяти процесса, поэтому при
+нескольких воркерах gunicorn каждый отдает свои значения, а метка
+``pid`` позволяет их различать при сборе.
+"""
+import os
+import threading
+
+from django.utils.module_loading import import_string
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+_MISSING = object()
+_local = threading.local()
+
+
+class Histogram:
+    """Гистограмма с накопительными корзинами, как в Prometheus."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[label]) for label in self.labels)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self.lock:
+            items = sorted(
+                (key, (list(buckets), total, count))
+                for key, (buckets, total, count) in self.values.items()
+            )
+        for key, (buckets, total, count) in items:
+            labels = dict(zip(self.labels, key))
+            for bound, value in zip(self.buckets, buckets):
+                yield '_bucket', {**labels, 'le': _format(bound)}, value
+            yield '_bucket', {**labels, 'le': '+Inf'}, count
+            yield '_sum', labels, total
+            yield '_count', labels, count
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[label]) for label in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            yield '', dict(zip(self.labels, key)), value
+
+
+REQUEST_DURATION = Histogram(
+    'yatube_request_duration_seconds',
+    'Время обработки запроса представлением.',
+    ('view', 'method'), DURATION_BUCKETS)
+REQUESTS = Counter(
+    'yatube_requests_total',
+    'Число запросов по кодам ответа.',
+    ('view', 'method', 'status'))
+SQL_QUERIES = Histogram(
+    'yatube_request_sql_queries',
+    'Число SQL-запросов за один запрос к сайту.',
+    ('view',), COUNT_BUCKETS)
+SQL_DURATION = Histogram(
+    'yatube_request_sql_duration_seconds',
+    'Суммарное время SQL-запросов за один запрос к сайту.',
+    ('view',), DURATION_BUCKETS)
+TEMPLATE_DURATION = Histogram(
+    'yatube_template_render_seconds',
+    'Время отрисовки шаблона ответа.',
+    ('view',), DURATION_BUCKETS)
+CACHE_REQUESTS = Counter(
+    'yatube_cache_requests_total',
+    'Обращения к кэшу за значениями: попадания и промахи.',
+    ('view', 'result'))
+DB_POOL_WAIT = Histogram(
+    'yatube_db_pool_wait_seconds',
+    'Ожидание свободного соединения в пуле.',
+    ('database',), DURATION_BUCKETS)
+DB_POOL_TIMEOUTS = Counter(
+    'yatube_db_pool_timeouts_total',
+    'Запросы соединения, не дождавшиеся свободного места в пуле.',
+    ('database',))
+DB_RECONNECTS = Counter(
+    'yatube_db_reconnects_total',
+    'Соединения пула, замененные после неудачной проверки.',
+    ('database',))
+
+REGISTRY = (
+    REQUEST_DURATION,
+    REQUESTS,
+    SQL_QUERIES,
+    SQL_DURATION,
+    TEMPLATE_DURATION,
+    CACHE_REQUESTS,
+    DB_POOL_WAIT,
+    DB_POOL_TIMEOUTS,
+    DB_RECONNECTS,
+)
+
+
+class RequestStats:
+    """Счетчики одного запроса; копятся в потоке, который его обслуживает."""
+
+    def __init__(self):
+        self.view = 'unresolved'
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+
+
+def start_request():
+    _local.stats = RequestStats()
+    return _local.stats
+
+
+def finish_request():
+    _local.stats = None
+
+
+def current():
+    return getattr(_local, 'stats', None)
+
+
+def record_query(duration):
+    stats = current()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_time += duration
+
+
+def record_template(duration):
+    stats = current()
+    if stats is not None:
+        stats.template_time += duration
+
+
+def record_cache(hits, misses):
+    stats = current()
+    view = stats.view if stats is not None else '-'
+    if hits:
+        CACHE_REQUESTS.inc(hits, view=view, result='hit')
+    if misses:
+        CACHE_REQUESTS.inc(misses, view=view, result='miss')
+
+
+class MeteredCache:
+    """Обертка над настроенным бэкендом кэша, считающая попадания.
+
+    Оборачивается только экземпляр кэша из CACHES, классы бэкендов
+    не меняются. Класс бэкенда задается ключом ``METERED_BACKEND``,
+    остальные параметры передаются ему как есть. Все, кроме get
+    и get_many, уходит в обернутый кэш без изменений.
+    """
+
+    def __init__(self, location, params):
+        params = dict(params)
+        backend = import_string(params.pop('METERED_BACKEND'))
+        self._cache = backend(location, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cache, name)
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    def get(self, key, default=None, version=None):
+        value = self._cache.get(key, _MISSING, version=version)
+        hit = value is not _MISSING
+        record_cache(int(hit), int(not hit))
+        return value if hit else default
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self._cache.get_many(keys, version=version)
+        record_cache(len(found), len(keys) - len(found))
+        return found
+
+
+def _format(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('\n', r'\n')
+            .replace('"', r'\"'))
+
+
+def render():
+    """Все метрики процесса в текстовом формате Prometheus."""
+    pid = os.getpid()
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for suffix, labels, value in metric.samples():
+            labels = {**labels, 'pid': pid}
+            rendered = ','.join(
+                f'{name}="{_escape(label)}"' for name, label in labels.items())
+            lines.append(f'{metric.name}{suffix}{{{rendered}}} '
+                         f'{_format(value)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,83 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import db_router, metrics
+
+
+def _time_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    """Собирает метрики запроса: время, SQL, кэш и отрисовку шаблонов.
+
+    Стоит первым в MIDDLEWARE, чтобы время включало остальные слои.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = metrics.start_request()
+        started = time.perf_counter()
+        response = None
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(_time_query))
+                response = self.get_response(request)
+            return response
+        finally:
+            duration = time.perf_counter() - started
+            metrics.finish_request()
+            self.record(request, response, stats, duration)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = metrics.current()
+        if stats is not None and request.resolver_match is not None:
+            stats.view = request.resolver_match.view_name
+
+    @staticmethod
+    def record(request, response, stats, duration):
+        view = stats.view
+        status = response.status_code if response is not None else 500
+        metrics.REQUEST_DURATION.observe(
+            duration, view=view, method=request.method)
+        metrics.REQUESTS.inc(
+            view=view, method=request.method, status=status)
+        metrics.SQL_QUERIES.observe(stats.sql_count, view=view)
+        metrics.SQL_DURATION.observe(stats.sql_time, view=view)
+        if stats.template_time:
+            metrics.TEMPLATE_DURATION.observe(stats.template_time, view=view)
+
+
+class ReplicaPinningMiddleware:
+    """Закрепляет основную базу за посетителем, который только что писал.
+
+    Ставит cookie на REPLICA_PIN_SECONDS секунд, пока декоратор
+    read_from_replica не отправляет чтения посетителя в реплики.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        db_router.start_request()
+        response = self.get_response(request)
+        if settings.DATABASE_REPLICAS and db_router.wrote():
+            response.set_cookie(
+                db_router.PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
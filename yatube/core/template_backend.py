@@ -0,0 +1,30 @@
+"""Бэкенд шаблонов Django, замеряющий время отрисовки для метрик."""
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+from . import metrics
+
+
+class Template(django_backend.Template):
+
+    def render(self, context=None, request=None):
+        # Вложенные include отрисовываются внутри и отдельно не считаются.
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.record_template(time.perf_counter() - started)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
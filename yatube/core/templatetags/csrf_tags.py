@@ -0,0 +1,37 @@
+from django import template
+from django.conf import settings
+from django.template.defaulttags import CsrfTokenNode
+from django.urls import reverse
+from django.utils.html import format_html
+
+register = template.Library()
+
+SCRIPT_RENDERED = 'deferred_csrf_script'
+
+
+@register.simple_tag(takes_context=True)
+def deferred_csrf_token(context):
+    """Поле CSRF-токена, которое заполняется скриптом после загрузки.
+
+    Токен не попадает в HTML, поэтому страница одинакова для всех
+    и может храниться в общем кэше. При CSRF_TOKEN_DEFERRED = False
+    работает как обычный {% csrf_token %}.
+    """
+    if not settings.CSRF_TOKEN_DEFERRED:
+        return CsrfTokenNode().render(context)
+    field = format_html(
+        '<input type="hidden" name="csrfmiddlewaretoken" value="" '
+        'data-csrf-deferred>')
+    if context.render_context.get(SCRIPT_RENDERED):
+        return field
+    context.render_context[SCRIPT_RENDERED] = True
+    return field + format_html(
+        '<script>'
+        'fetch("{}", {{credentials: "same-origin"}})'
+        '.then((response) => response.json())'
+        '.then((data) => document.querySelectorAll('
+        '"input[data-csrf-deferred]").forEach('
+        '(input) => {{ input.value = data.token; }}));'
+        '</script>',
+        reverse('csrf_token'),
+    )
@@ -0,0 +1,158 @@
+"""Локальная замена сервера Redis для тестов.
+
+Понимает протокол RESP и те команды, которыми пользуется
+core.redis_cache.RedisCache. Данные хранятся в памяти процесса сервера,
+а клиенты подключаются к нему по TCP, как к настоящему Redis.
+"""
+import socketserver
+import threading
+import time
+
+
+class RedisStubHandler(socketserver.StreamRequestHandler):
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line.startswith(b'*'):
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        authenticated = self.server.password is None
+        while True:
+            command = self.read_command()
+            if command is None:
+                return
+            if command[0].upper() == b'AUTH':
+                authenticated = self.server.check_auth(*command[1:])
+                reply = (b'+OK\r\n' if authenticated else
+                         b'-WRONGPASS invalid username-password pair\r\n')
+            elif not authenticated:
+                reply = b'-NOAUTH Authentication required.\r\n'
+            else:
+                reply = self.server.dispatch(command)
+            self.wfile.write(reply)
+
+
+class RedisStub(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0), username=None,
+                 password=None):
+        super().__init__(address, RedisStubHandler)
+        self.username = username
+        self.password = password
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.Lock()
+
+    @property
+    def location(self):
+        host, port = self.server_address
+        return f'redis://{host}:{port}/0'
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def check_auth(self, *credentials):
+        """AUTH пароль или AUTH пользователь пароль."""
+        if self.password is None:
+            return True
+        username = (credentials[0].decode() if len(credentials) > 1
+                    else 'default')
+        return (credentials[-1].decode() == self.password
+                and username == (self.username or 'default'))
+
+    def _alive(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def dispatch(self, command):
+        name = command[0].decode().upper()
+        handler = getattr(self, f'command_{name.lower()}', None)
+        if handler is None:
+            return b'-ERR unknown command\r\n'
+        with self.lock:
+            return handler(*command[1:])
+
+    @staticmethod
+    def bulk(value):
+        if value is None:
+            return b'$-1\r\n'
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+
+    def command_ping(self):
+        return b'+PONG\r\n'
+
+    def command_select(self, db):
+        return b'+OK\r\n'
+
+    def command_get(self, key):
+        return self.bulk(self.data.get(key) if self._alive(key) else None)
+
+    def command_mget(self, *keys):
+        replies = [self.command_get(key) for key in keys]
+        return b'*%d\r\n' % len(keys) + b''.join(replies)
+
+    def command_set(self, key, value, *flags):
+        flags = [flag.upper() for flag in flags]
+        if b'NX' in flags and self._alive(key):
+            return b'$-1\r\n'
+        self.data[key] = value
+        self.expires.pop(key, None)
+        if b'PX' in flags:
+            milliseconds = int(flags[flags.index(b'PX') + 1])
+            self.expires[key] = time.monotonic() + milliseconds / 1000
+        return b'+OK\r\n'
+
+    def command_del(self, *keys):
+        deleted = 0
+        for key in keys:
+            if self._alive(key):
+                deleted += 1
+                del self.data[key]
+                self.expires.pop(key, None)
+        return b':%d\r\n' % deleted
+
+    def command_exists(self, *keys):
+        return b':%d\r\n' % sum(self._alive(key) for key in keys)
+
+    def command_incrby(self, key, delta):
+        value = self.data.get(key, b'0') if self._alive(key) else b'0'
+        try:
+            value = int(value) + int(delta)
+        except ValueError:
+            return b'-ERR value is not an integer or out of range\r\n'
+        self.data[key] = str(value).encode()
+        return b':%d\r\n' % value
+
+    def command_pexpire(self, key, milliseconds):
+        if not self._alive(key):
+            return b':0\r\n'
+        self.expires[key] = time.monotonic() + int(milliseconds) / 1000
+        return b':1\r\n'
+
+    def command_persist(self, key):
+        if not self._alive(key) or key not in self.expires:
+            return b':0\r\n'
+        del self.expires[key]
+        return b':1\r\n'
+
+    def command_flushdb(self):
+        self.data.clear()
+        self.expires.clear()
+        return b'+OK\r\n'
@@ -0,0 +1,103 @@
+import multiprocessing
+
+from django.core.cache import caches
+from django.test import SimpleTestCase
+
+from core.redis_cache import RedisCache, RedisError
+from core.tests.redis_stub import RedisStub
+from posts import feed_cache
+
+
+def read_index_version(results):
+    results.put(feed_cache.version(feed_cache.index_feed()))
+
+
+def bump_index_version(results):
+    feed_cache.bump(feed_cache.index_feed())
+    results.put(True)
+
+
+class RedisCacheTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = RedisStub().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        settings = self.settings(CACHES={
+            'default': {
+                'BACKEND': 'core.redis_cache.RedisCache',
+                'LOCATION': self.server.location,
+            }
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.cache = caches['default']
+        self.cache.clear()
+
+    def test_basic_operations(self):
+        """Бэкенд поддерживает основные операции кэша Django."""
+        self.cache.set('post', {'text': 'Пост'})
+        self.assertEqual(self.cache.get('post'), {'text': 'Пост'})
+        self.assertFalse(self.cache.add('post', 'другое значение'))
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        self.assertEqual(
+            self.cache.get_many(['post', 'counter', 'missing']),
+            {'post': {'text': 'Пост'}, 'counter': 6},
+        )
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.delete('post')
+        self.assertIsNone(self.cache.get('post'))
+        self.cache.set('expired', 'значение', timeout=0)
+        self.assertIsNone(self.cache.get('expired'))
+
+    def test_invalidation_is_seen_by_other_process(self):
+        """Сброс версии ленты в одном процессе виден в другом."""
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+
+        def run(target):
+            process = context.Process(target=target, args=(results,))
+            process.start()
+            process.join(10)
+            self.assertEqual(process.exitcode, 0)
+            return results.get(timeout=5)
+
+        before = run(read_index_version)
+        run(bump_index_version)
+        after = run(read_index_version)
+        self.assertEqual(after, before + 1)
+        self.assertEqual(
+            feed_cache.version(feed_cache.index_feed()), after)
+
+
+class RedisAuthTests(SimpleTestCase):
+    def setUp(self):
+        self.server = RedisStub(username='yatube', password='p@ss').start()
+        self.addCleanup(self.server.stop)
+        self.host = self.server.location.split('//', 1)[1]
+
+    def cache(self, location, **options):
+        return RedisCache(location, {'OPTIONS': options})
+
+    def test_password_is_sent(self):
+        """Пароль из адреса или OPTIONS отправляется командой AUTH."""
+        caches = [
+            self.cache(f'redis://yatube:p%40ss@{self.host}'),
+            self.cache(f'redis://yatube@{self.host}', PASSWORD='p@ss'),
+        ]
+        for cache in caches:
+            with self.subTest(cache=cache):
+                cache.set('key', 'значение')
+                self.assertEqual(cache.get('key'), 'значение')
+
+    def test_without_password_fails(self):
+        with self.assertRaises(RedisError):
+            self.cache(f'redis://{self.host}').get('key')
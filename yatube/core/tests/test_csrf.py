@@ -0,0 +1,45 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class DeferredCsrfTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        self.client = Client(enforce_csrf_checks=True)
+        self.client.force_login(self.user)
+        self.comment_url = reverse(
+            'posts:add_comment', kwargs={'post_id': self.post.id})
+
+    def test_page_has_no_token(self):
+        """Страница поста не содержит токена и не ставит cookie CSRF."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        self.assertContains(response, 'data-csrf-deferred')
+        self.assertContains(response, 'value="" data-csrf-deferred')
+        self.assertNotIn('csrftoken', response.cookies)
+
+    def test_post_requires_fetched_token(self):
+        """Комментарий принимается только с токеном из /csrf/."""
+        response = self.client.post(self.comment_url, {'text': 'Без токена'})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(reverse('csrf_token'))
+        self.assertIn('no-cache', response['Cache-Control'])
+        token = json.loads(response.content)['token']
+        response = self.client.post(
+            self.comment_url,
+            {'text': 'С токеном', 'csrfmiddlewaretoken': token},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Comment.objects.filter(text='С токеном').exists())
@@ -0,0 +1,131 @@
+import os
+import sqlite3
+import tempfile
+import threading
+
+from django.db import connections
+from django.test import SimpleTestCase
+
+from core import metrics
+from core.db import pool
+from core.db.sqlite3.base import DatabaseWrapper
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.opened = []
+
+    def connect(self):
+        connection = sqlite3.connect(':memory:', check_same_thread=False)
+        self.opened.append(connection)
+        return connection
+
+    def make_pool(self, **kwargs):
+        return pool.ConnectionPool('pool_test', **kwargs)
+
+    def count(self, counter):
+        return counter.values.get(('pool_test',), 0)
+
+    def test_released_connection_is_reused(self):
+        """Возвращенное соединение выдается снова без переподключения."""
+        connections_pool = self.make_pool(size=2)
+        pooled = connections_pool.acquire(self.connect)
+        connections_pool.release(pooled)
+        self.assertIs(connections_pool.acquire(self.connect), pooled)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_pool_is_bounded(self):
+        """Сверх SIZE соединений поток ждет и получает PoolTimeout."""
+        connections_pool = self.make_pool(size=1, timeout=0.05)
+        connections_pool.acquire(self.connect)
+        timeouts = self.count(metrics.DB_POOL_TIMEOUTS)
+        with self.assertRaises(pool.PoolTimeout):
+            connections_pool.acquire(self.connect)
+        self.assertEqual(self.count(metrics.DB_POOL_TIMEOUTS), timeouts + 1)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_waiting_thread_gets_released_connection(self):
+        connections_pool = self.make_pool(size=1, timeout=5)
+        pooled = connections_pool.acquire(self.connect)
+        received = []
+        waiter = threading.Thread(
+            target=lambda: received.append(
+                connections_pool.acquire(self.connect)))
+        waiter.start()
+        connections_pool.release(pooled)
+        waiter.join(5)
+        self.assertEqual(received, [pooled])
+
+    def test_dead_connection_is_replaced(self):
+        """Соединение, не прошедшее проверку, заменяется новым."""
+        connections_pool = self.make_pool(size=1, check_after=0)
+        pooled = connections_pool.acquire(self.connect)
+        connections_pool.release(pooled)
+        pooled.connection.close()
+        reconnects = self.count(metrics.DB_RECONNECTS)
+        fresh = connections_pool.acquire(self.connect)
+        self.assertIsNot(fresh, pooled)
+        self.assertTrue(pool.is_alive(fresh.connection))
+        self.assertEqual(self.count(metrics.DB_RECONNECTS), reconnects + 1)
+
+    def test_unusable_and_old_connections_are_closed(self):
+        """Соединение с ошибкой или старше MAX_AGE не возвращается в пул."""
+        for kwargs, usable in (({}, False), ({'max_age': 0}, True)):
+            with self.subTest(kwargs=kwargs, usable=usable):
+                connections_pool = self.make_pool(size=1, **kwargs)
+                pooled = connections_pool.acquire(self.connect)
+                connections_pool.release(pooled, usable)
+                self.assertFalse(pool.is_alive(pooled.connection))
+                self.assertIsNot(
+                    connections_pool.acquire(self.connect), pooled)
+
+
+class PooledBackendTests(SimpleTestCase):
+    """Бэкенд Django берет соединения из пула и возвращает их туда."""
+
+    def setUp(self):
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        self.addCleanup(pool.reset_pools)
+        self.settings_dict = {
+            **connections['default'].settings_dict,
+            'NAME': path,
+            'POOL': {'SIZE': 1, 'TIMEOUT': 0.05},
+        }
+
+    def wrapper(self):
+        return DatabaseWrapper(self.settings_dict, alias='pool_test')
+
+    def test_close_returns_connection_to_pool(self):
+        first = self.wrapper()
+        first.ensure_connection()
+        raw = first.connection
+        first.close()
+        self.assertIsNone(first.connection)
+        second = self.wrapper()
+        with second.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.assertIs(second.connection, raw)
+        second.close()
+
+    def test_connection_closed_in_transaction_is_not_reused(self):
+        first = self.wrapper()
+        first.ensure_connection()
+        raw = first.connection
+        first.set_autocommit(False)
+        first.in_atomic_block = True
+        first.close()
+        first.in_atomic_block = False
+        second = self.wrapper()
+        second.ensure_connection()
+        self.assertIsNot(second.connection, raw)
+        second.close()
+
+    def test_pool_can_be_disabled(self):
+        self.settings_dict['POOL'] = {'SIZE': 0}
+        wrapper = self.wrapper()
+        wrapper.ensure_connection()
+        wrapper.close()
+        self.assertFalse(
+            any(key[1] == 'pool_test' for key in pool._pools))
@@ -0,0 +1,109 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import db_router
+from posts.models import Post
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = db_router.ReplicaRouter()
+        db_router.start_request()
+
+    def test_reads_go_to_replica_only_when_asked(self):
+        """Чтение идет в реплику только внутри replica_reads."""
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        with db_router.replica_reads():
+            self.assertEqual(self.router.db_for_read(Post), 'replica_1')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_write_switches_reads_to_primary(self):
+        """После записи чтения запроса идут в основную базу."""
+        with db_router.replica_reads():
+            self.assertEqual(self.router.db_for_write(Post), 'default')
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertTrue(db_router.wrote())
+
+    def test_read_primary_and_unpinned_writes(self):
+        """read_primary уводит чтения в основную базу, а запись внутри
+        without_pinning не закрепляет посетителя."""
+        with db_router.replica_reads():
+            with db_router.without_pinning():
+                self.router.db_for_write(Post)
+                self.assertEqual(self.router.db_for_read(Post), 'default')
+            self.assertFalse(db_router.wrote())
+            self.assertEqual(self.router.db_for_read(Post), 'replica_1')
+            db_router.read_primary()
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_no_migrations_on_replicas(self):
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+        self.assertFalse(self.router.allow_migrate('replica_1', 'posts'))
+
+
+# Реплика указывает на ту же тестовую базу, а выбор реплики отслеживается.
+@override_settings(DATABASE_REPLICAS=['default'], REPLICA_LAG_SECONDS=0)
+class ReplicaViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+        patcher = mock.patch.object(
+            db_router, 'choose_replica', return_value='default')
+        self.choose_replica = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_feeds_read_from_replica(self):
+        """Ленты и пост читаются из реплики и не закрепляют базу."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.choose_replica.reset_mock()
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(self.choose_replica.called)
+                self.assertNotIn(db_router.PIN_COOKIE, response.cookies)
+
+    def test_write_pins_primary(self):
+        """После публикации поста автор читает ленты из основной базы."""
+        response = self.client.post(
+            reverse('posts:create'), {'text': 'Новый пост'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(db_router.PIN_COOKIE, response.cookies)
+        self.choose_replica.reset_mock()
+        response = self.client.get(
+            reverse('posts:profile', args=[self.user.username]))
+        self.assertContains(response, 'Новый пост')
+        self.assertFalse(self.choose_replica.called)
+
+    @override_settings(REPLICA_LAG_SECONDS=60)
+    def test_recently_changed_feed_reads_primary(self):
+        """Только что измененную ленту даже гость читает из основной базы."""
+        Post.objects.create(author=self.user, text='Новый пост')
+        self.choose_replica.reset_mock()
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'Новый пост')
+        self.assertFalse(self.choose_replica.called)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_pin_without_replicas(self):
+        response = self.client.post(
+            reverse('posts:create'), {'text': 'Новый пост'})
+        self.assertNotIn(db_router.PIN_COOKIE, response.cookies)
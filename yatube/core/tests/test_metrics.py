@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+
+User = get_user_model()
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+    def sample(self, text, name, **labels):
+        """Значение строки метрики с заданными метками (без pid)."""
+        for line in text.splitlines():
+            if not line.startswith(name + '{'):
+                continue
+            rendered = line[len(name) + 1:line.index('}')]
+            found = dict(
+                part.split('=', 1) for part in rendered.split(','))
+            if all(found.get(key) == f'"{value}"'
+                   for key, value in labels.items()):
+                return float(line.rsplit(' ', 1)[1])
+        return 0
+
+    def test_request_metrics(self):
+        """Метрики считают запросы, SQL, шаблоны и кэш по представлению."""
+        before = metrics.render()
+        self.client.get(reverse('posts:index'))
+        text = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        ).content.decode()
+        view = 'posts:index'
+        self.assertEqual(
+            self.sample(text, 'yatube_request_duration_seconds_count',
+                        view=view, method='GET')
+            - self.sample(before, 'yatube_request_duration_seconds_count',
+                          view=view, method='GET'),
+            1,
+        )
+        self.assertGreater(
+            self.sample(text, 'yatube_request_sql_queries_sum', view=view),
+            self.sample(before, 'yatube_request_sql_queries_sum', view=view),
+        )
+        self.assertGreater(
+            self.sample(text, 'yatube_template_render_seconds_count',
+                        view=view),
+            self.sample(before, 'yatube_template_render_seconds_count',
+                        view=view),
+        )
+        cache_requests = sum(
+            self.sample(text, 'yatube_cache_requests_total',
+                        view=view, result=result)
+            for result in ('hit', 'miss')
+        )
+        self.assertGreater(cache_requests, 0)
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram',
+                      text)
+
+    def test_metrics_are_private(self):
+        """Метрики недоступны без верного токена, даже с localhost."""
+        for header in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'}):
+            with self.subTest(header=header):
+                response = self.client.get(
+                    reverse('metrics'), REMOTE_ADDR='127.0.0.1', **header)
+                self.assertEqual(response.status_code, 404)
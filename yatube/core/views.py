@@ -1,4 +1,11 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from django.middleware.csrf import get_token
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.cache import never_cache
+
+from . import metrics
 
 
 def page_not_found(request, exception):
@@ -11,6 +18,31 @@ def permission_denied_view(request, reason=''):
     return render(request, 'core/403.html', {'path': request.path}, status=403)
 
 
+def csrf_failure(request, reason=''):
+    """Вызывает шаблон ошибки 403 при ошибке проверки CSRF"""
+    return render(request, 'core/403.html', {'path': request.path}, status=403)
+
+
 def server_error(request):
     """Вызывает шаблон ошибки 500"""
     return render(request, 'core/500.html', status=500)
+
+
+def metrics_view(request):
+    """Отдает метрики процесса в формате Prometheus.
+
+    Доступ только с заголовком ``Authorization: Bearer <METRICS_TOKEN>``:
+    за nginx адрес клиента всегда локальный и ничего не доказывает.
+    """
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not token or not constant_time_compare(header, f'Bearer {token}'):
+        raise Http404
+    return HttpResponse(
+        metrics.render(), content_type='text/plain; version=0.0.4')
+
+
+@never_cache
+def csrf_token_view(request):
+    """Отдает CSRF-токен для форм на закэшированных страницах."""
+    return JsonResponse({'token': get_token(request)})
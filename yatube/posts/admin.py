@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Post, Group
 
 
@@ -16,6 +17,13 @@ class PostAdmin(admin.ModelAdmin):
     list_editable = ('group',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по полнотекстовому индексу, а не через LIKE '%q%'."""
+        if not search_term.strip():
+            return queryset, False
+        found = search.search(search_term).values('pk')
+        return queryset.filter(pk__in=found), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = (
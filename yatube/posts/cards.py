@@ -0,0 +1,85 @@
+"""Кэш отрисованных карточек постов, общий для всех лент.
+
+Карточка одного поста одинакова на главной, в группе, профиле, ленте
+подписок и поиске, поэтому она отрисовывается один раз и берется из кэша
+во всех лентах. Ключ карточки — хэш всего, что в ней показано: текста,
+даты, картинки и готовых миниатюр, имени автора, названия группы. Эти
+поля уже загружены запросом ленты (Post.objects.for_feed), так что ключ
+меняется вместе с постом, автором или группой без отдельного сброса кэша.
+Карточки страницы читаются из кэша одним get_many.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from . import thumbnails
+
+CARD_KEY = 'post-card:{}:{}'
+CARD_TEMPLATE = 'includes/post_card.html'
+
+
+def _thumbnails(post):
+    return sorted(
+        (thumbnail.alias, thumbnail.url, thumbnail.width, thumbnail.height)
+        for thumbnail in post.thumbnails.all()
+        if thumbnail.source == post.image.name
+    )
+
+
+def is_complete(post):
+    """Готовы ли все миниатюры картинки поста.
+
+    Карточку с заглушкой не кэшируем: при отрисовке недостающие миниатюры
+    ставятся в очередь, и следующая отрисовка их подхватит. После
+    неудачной попытки карточка кэшируется как есть: когда миниатюры
+    появятся, изменится и ключ карточки.
+    """
+    if not post.image or thumbnails.failed(post.image.name):
+        return True
+    ready = {thumbnail[0] for thumbnail in _thumbnails(post)}
+    return ready.issuperset(
+        thumbnails.FEED_SRCSET + thumbnails.FEED_WEBP_SRCSET)
+
+
+def card_key(post, eager=False):
+    author = post.author
+    group = post.group
+    shown = repr((
+        post.text,
+        post.pub_date.isoformat(),
+        post.image.name,
+        _thumbnails(post),
+        author.username,
+        author.first_name,
+        author.last_name,
+        group and (group.slug, group.title),
+        eager,
+    ))
+    return CARD_KEY.format(
+        post.pk, hashlib.md5(shown.encode()).hexdigest())
+
+
+def render_cards(posts):
+    """Список HTML карточек постов в порядке ленты.
+
+    Картинка первой карточки грузится сразу, остальные лениво.
+    """
+    posts = list(posts)
+    keys = [card_key(post, eager=number == 0)
+            for number, post in enumerate(posts)]
+    found = cache.get_many(keys)
+    missing = {}
+    cards = []
+    for number, (key, post) in enumerate(zip(keys, posts)):
+        card = found.get(key)
+        if card is None:
+            card = render_to_string(
+                CARD_TEMPLATE, {'post': post, 'eager': number == 0})
+            if is_complete(post):
+                missing[key] = card
+        cards.append(card)
+    if missing:
+        cache.set_many(missing, settings.CARD_CACHE_TIMEOUT)
+    return cards
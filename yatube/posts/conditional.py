@@ -0,0 +1,84 @@
+"""Условные GET-запросы (ETag и Last-Modified) по версиям лент.
+
+Валидатор страницы строится из версий лент, которые она показывает,
+поэтому ответ 304 отдается до выборки постов и отрисовки шаблона.
+Разметка для вошедшего пользователя зависит от него самого (шапка,
+кнопки подписки и редактирования, CSRF-токен формы), поэтому он входит
+в ETag, а Last-Modified отдается только гостям.
+
+Гость определяется по отсутствию cookie сессии, как в
+AnonymousPageCacheMiddleware, без обращения к сессии. Его страницы
+помечаются public с коротким s-maxage, чтобы их мог держать и общий кэш
+перед сайтом.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from . import feed_cache
+from .middleware import AnonymousPageCacheMiddleware
+
+
+def _is_guest(request):
+    if AnonymousPageCacheMiddleware.is_guest_read(request):
+        return True
+    return not request.user.is_authenticated
+
+
+def _validators(request, feeds):
+    if feeds is None:
+        return None, None
+    versions = feed_cache.versions(*feeds)
+    # По этим версиям AnonymousPageCacheMiddleware проверяет копию страницы.
+    request.page_cache_versions = versions
+    parts = [f'{feed}={versions[feed]}' for feed in sorted(versions)]
+    modified = None
+    if not _is_guest(request):
+        parts.append(f'user={request.user.pk}')
+        parts.append(f'csrf={request.META.get("CSRF_COOKIE", "")}')
+    else:
+        modified = feed_cache.last_modified(*feeds)
+    digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return f'W/"{digest}"', modified
+
+
+def feed_condition(feeds_func):
+    """Декоратор condition() для страницы, показывающей ленты feeds_func.
+
+    feeds_func получает аргументы представления и возвращает список лент
+    или None, если объекта нет (тогда представление ответит 404 само).
+    """
+    def validators(request, *args, **kwargs):
+        if not hasattr(request, '_feed_validators'):
+            request._feed_validators = _validators(
+                request, feeds_func(*args, **kwargs))
+        return request._feed_validators
+
+    def etag(request, *args, **kwargs):
+        return validators(request, *args, **kwargs)[0]
+
+    def last_modified(request, *args, **kwargs):
+        return validators(request, *args, **kwargs)[1]
+
+    conditional = condition(etag_func=etag, last_modified_func=last_modified)
+
+    def decorator(view):
+        conditional_view = conditional(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if (AnonymousPageCacheMiddleware.is_guest_read(request)
+                    and response.status_code in (200, 304)
+                    and not response.cookies):
+                patch_cache_control(
+                    response, public=True, max_age=0,
+                    s_maxage=settings.PAGE_SHARED_MAX_AGE)
+                # Вошедшему пользователю общий кэш эту копию не отдаст.
+                patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
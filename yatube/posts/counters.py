@@ -0,0 +1,73 @@
+"""Поддержка денормализованных счетчиков постов, комментариев и подписок."""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, UserCounter
+
+User = get_user_model()
+
+USER_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def _count_subquery(model, field, outer='pk'):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef(outer)})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), Value(0))
+
+
+def change_user(user_id, name, delta):
+    """Атомарно изменяет счетчик пользователя на delta.
+
+    Строки счетчиков создаются вместе с пользователем; если строки нет,
+    изменение пропускается, и его восстановит rebuild_counters. Счетчик
+    не опускается ниже нуля, даже если он отстал от таблиц (например,
+    после массовой загрузки до rebuild_counters).
+    """
+    if user_id is None:
+        return
+    UserCounter.objects.filter(user_id=user_id).update(
+        **{name: Greatest(F(name) + delta, 0)})
+
+
+def change_post(post_id, delta):
+    """Атомарно изменяет число комментариев поста на delta."""
+    if post_id is None:
+        return
+    Post.objects.filter(pk=post_id).update(
+        comments_count=Greatest(F('comments_count') + delta, 0))
+
+
+def rebuild():
+    """Сверяет все счетчики с исходными таблицами и исправляет их.
+
+    Возвращает словарь с числом исправленных строк по каждому счетчику.
+    """
+    missing = User.objects.filter(counters__isnull=True).values_list(
+        'pk', flat=True)
+    UserCounter.objects.bulk_create(
+        [UserCounter(user_id=user_id) for user_id in missing.iterator()],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    fixed = {}
+    comments = _count_subquery(Comment, 'post')
+    stale = Post.objects.annotate(actual=comments).exclude(
+        comments_count=F('actual'))
+    fixed['comments_count'] = stale.count()
+    Post.objects.update(comments_count=comments)
+    for name, (model, field) in USER_COUNTERS.items():
+        actual = _count_subquery(model, field, outer='user_id')
+        stale = UserCounter.objects.annotate(actual=actual).exclude(
+            **{name: F('actual')})
+        fixed[name] = stale.count()
+        UserCounter.objects.update(**{name: actual})
+    return fixed
@@ -0,0 +1,202 @@
+"""Версии лент для кэша отрисованных страниц.
+
+У каждой ленты (главная, группа, профиль автора, страница поста) есть
+счетчик версии в кэше. Он входит в ключ закэшированного фрагмента
+и увеличивается сигналами при изменении постов, комментариев и групп,
+поэтому свежие данные видны сразу, а не по истечении TTL.
+
+Отдельно считаются новые посты лент: по этим счетчикам клиент узнает
+о новых постах, не загружая саму ленту (см. wait_for_posts). У ленты
+подписок читателя один свой счетчик (timeline_feed), его увеличивает
+раскладка поста по лентам; посты подмешиваемых авторов видны по
+счетчикам их профилей. Счетчики
+должны быть общими для всех процессов, поэтому с кэшем в памяти процесса
+эта возможность выключена (NEW_POSTS_ENABLED).
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import db_router
+
+VERSION_KEY = 'feed-version:{}'
+MODIFIED_KEY = 'feed-modified:{}'
+POSTS_KEY = 'feed-posts:{}'
+
+
+def index_feed():
+    return 'index'
+
+
+def group_feed(group_id):
+    return f'group:{group_id}'
+
+
+def profile_feed(author_id):
+    return f'profile:{author_id}'
+
+
+def post_feed(post_id):
+    return f'post:{post_id}'
+
+
+def timeline_feed(user_id):
+    """Лента подписок читателя; ее счетчик новых постов ведет раскладка."""
+    return f'timeline:{user_id}'
+
+
+def views_feed(post_id):
+    """Число просмотров поста; меняется при записи просмотров в базу."""
+    return f'views:{post_id}'
+
+
+def post_feeds(post):
+    """Ленты, в которых показывается пост."""
+    feeds = [
+        index_feed(),
+        profile_feed(post.author_id),
+        post_feed(post.pk),
+    ]
+    if post.group_id is not None:
+        feeds.append(group_feed(post.group_id))
+    return feeds
+
+
+def _initial_version():
+    # После вытеснения или очистки кэша счетчик начинается с нового
+    # значения, чтобы не совпасть со старыми закэшированными фрагментами.
+    return int(time.time() * 1000)
+
+
+def versions(*feeds):
+    """Возвращает текущие версии лент одним обращением к кэшу.
+
+    Если какая-то из лент изменилась недавно и реплика могла еще не
+    догнать основную базу, остальные чтения запроса идут в основную базу.
+    """
+    keys = {VERSION_KEY.format(feed): feed for feed in feeds}
+    modified_keys = [MODIFIED_KEY.format(feed) for feed in feeds]
+    found = cache.get_many([*keys, *modified_keys])
+    now = time.time()
+    for key in keys.keys() - found.keys():
+        cache.add(key, _initial_version(), None)
+        # Момент изменения неизвестен, поэтому считается текущим.
+        cache.add(MODIFIED_KEY.format(keys[key]), now, None)
+        found[key] = cache.get(key)
+    # Отстающая реплика покажет лишь чуть меньшее число просмотров,
+    # поэтому их запись не переводит чтения в основную базу.
+    modified = [
+        found.get(key, now)
+        for feed, key in zip(feeds, modified_keys)
+        if not feed.startswith(views_feed(''))
+    ]
+    if modified and max(modified) > now - settings.REPLICA_LAG_SECONDS:
+        db_router.read_primary()
+    return {keys[key]: found[key] for key in keys}
+
+
+def version(feed):
+    return versions(feed)[feed]
+
+
+def bump(*feeds):
+    """Увеличивает версии лент, делая их закэшированные страницы старыми."""
+    feeds = set(feeds)
+    for feed in feeds:
+        key = VERSION_KEY.format(feed)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), None)
+    now = time.time()
+    cache.set_many({MODIFIED_KEY.format(feed): now for feed in feeds}, None)
+
+
+def last_modified(*feeds):
+    """Время последнего изменения лент или None, если оно неизвестно."""
+    keys = [MODIFIED_KEY.format(feed) for feed in feeds]
+    found = cache.get_many(keys)
+    if len(found) < len(keys):
+        return None
+    return datetime.fromtimestamp(max(found.values()), timezone.utc)
+
+
+def cache_context(feed):
+    """Контекст шаблона для кэширования фрагмента ленты."""
+    return {
+        'feed_cache_key': f'{feed}:{version(feed)}',
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
+
+
+def count_post(post):
+    """Учитывает новый пост в счетчиках его лент (вызывается сигналом)."""
+    feeds = [index_feed(), profile_feed(post.author_id)]
+    if post.group_id is not None:
+        feeds.append(group_feed(post.group_id))
+    count_posts(*feeds)
+
+
+def count_posts(*feeds):
+    """Увеличивает счетчики новых постов лент feeds."""
+    for feed in feeds:
+        key = POSTS_KEY.format(feed)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, None)
+
+
+def posts_count(*feeds):
+    """Сумма счетчиков новых постов лент одним обращением к кэшу.
+
+    Значение годится только для сравнения с прошлым значением тех же
+    лент. После вытеснения счетчика из кэша он начинается заново.
+    """
+    keys = [POSTS_KEY.format(feed) for feed in feeds]
+    return sum(cache.get_many(keys).values())
+
+
+def _feeds_digest(feeds):
+    return hashlib.md5('|'.join(sorted(feeds)).encode()).hexdigest()[:8]
+
+
+def posts_cursor(feeds, count=None):
+    """Метка счетчика новых постов лент feeds для клиента.
+
+    В метку входит отпечаток набора лент: после подписки на нового автора
+    сумма счетчиков ленты подписок скачет, и старая метка к ней не
+    подходит (см. parse_posts_cursor).
+    """
+    if count is None:
+        count = posts_count(*feeds)
+    return f'{count}:{_feeds_digest(feeds)}'
+
+
+def parse_posts_cursor(cursor, feeds):
+    """Значение счетчика из метки или None, если метка от другого
+    набора лент или испорчена."""
+    count, _, digest = (cursor or '').partition(':')
+    if digest != _feeds_digest(feeds):
+        return None
+    try:
+        return int(count)
+    except ValueError:
+        return None
+
+
+def wait_for_posts(feeds, since, timeout):
+    """Ждет до timeout секунд, пока счетчик новых постов отличается от since.
+
+    Возвращает текущее значение счетчика. Читает только кэш.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        current = posts_count(*feeds)
+        if current != since or time.monotonic() >= deadline:
+            return current
+        time.sleep(min(settings.NEW_POSTS_POLL_INTERVAL,
+                       max(deadline - time.monotonic(), 0)))
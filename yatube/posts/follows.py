@@ -0,0 +1,41 @@
+"""Кэш подписок: проверка «подписан ли пользователь на автора» для профиля
+и список авторов, на которых подписан пользователь."""
+from django.core.cache import cache
+
+from .models import Follow
+
+FOLLOW_KEY = 'follow:{}:{}'
+FOLLOWING_KEY = 'following:{}'
+FOLLOW_TIMEOUT = 60 * 60
+
+
+def is_following(user_id, author_id):
+    key = FOLLOW_KEY.format(user_id, author_id)
+    following = cache.get(key)
+    if following is None:
+        following = Follow.objects.filter(
+            user_id=user_id, author_id=author_id).exists()
+        cache.set(key, following, FOLLOW_TIMEOUT)
+    return following
+
+
+def followed_authors(user_id):
+    key = FOLLOWING_KEY.format(user_id)
+    authors = cache.get(key)
+    if authors is None:
+        authors = list(Follow.objects.filter(
+            user_id=user_id).values_list('author_id', flat=True))
+        cache.set(key, authors, FOLLOW_TIMEOUT)
+    return authors
+
+
+def forget(user_id, author_id):
+    """Сбрасывает кэш при подписке и отписке (вызывается сигналами).
+
+    Значение удаляется, а не записывается, чтобы откат транзакции
+    с подпиской не оставил в кэше неверный ответ.
+    """
+    cache.delete_many([
+        FOLLOW_KEY.format(user_id, author_id),
+        FOLLOWING_KEY.format(user_id),
+    ])
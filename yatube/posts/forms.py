@@ -1,5 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
 
+from . import images
 from .models import Post, Comment
 
 
@@ -8,6 +11,20 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # Уже сохраненная картинка при правке поста приходит как FieldFile.
+        if isinstance(image, UploadedFile):
+            # Заголовок может быть цел, а данные обрезаны или слишком
+            # велики: это выясняется только при декодировании.
+            try:
+                return images.normalize(image)
+            except (OSError, Image.DecompressionBombError):
+                raise forms.ValidationError(
+                    'Не удалось прочитать картинку: файл поврежден '
+                    'или слишком велик.')
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,72 @@
+"""Обработка картинок постов при загрузке.
+
+Снимки с камеры весят десятки мегабайт, а показываются в ленте
+миниатюрой. Поэтому загруженная картинка сразу уменьшается до
+IMAGE_MAX_SIDE пикселей по большей стороне, поворачивается по метке
+ориентации и пересохраняется прогрессивным JPEG без EXIF (в нем бывают
+координаты съемки). Миниатюры и варианты WebP потом строятся уже из
+уменьшенного файла (см. thumbnails).
+
+Анимированные GIF и небольшие GIF сохраняются как есть, чтобы не
+потерять анимацию и палитру.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image, ImageOps
+
+BACKGROUND = (255, 255, 255)
+
+
+def keeps_original(image):
+    if image.format != 'GIF':
+        return False
+    return (getattr(image, 'is_animated', False)
+            or max(image.size) <= settings.IMAGE_MAX_SIDE)
+
+
+def flatten(image):
+    """Переводит картинку в RGB, подкладывая белый фон под прозрачность."""
+    if image.mode in ('RGBA', 'LA') or (
+            image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, BACKGROUND)
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def normalize(upload):
+    """Уменьшенная и пересохраненная копия загруженной картинки.
+
+    Результат пишется во временный файл, который остается в памяти,
+    только пока меньше FILE_UPLOAD_MAX_MEMORY_SIZE.
+    """
+    max_side = settings.IMAGE_MAX_SIDE
+    upload.seek(0)
+    with Image.open(upload) as source:
+        if keeps_original(source):
+            upload.seek(0)
+            return upload
+        icc_profile = source.info.get('icc_profile')
+        # Декодер JPEG сразу читает уменьшенную в 2^n раз картинку,
+        # не разворачивая в памяти полный кадр.
+        source.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(source)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        image = flatten(image)
+    output = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    image.save(
+        output,
+        'JPEG',
+        quality=settings.IMAGE_JPEG_QUALITY,
+        optimize=True,
+        progressive=True,
+        icc_profile=icc_profile,
+    )
+    output.seek(0)
+    name = os.path.splitext(os.path.basename(upload.name))[0] + '.jpg'
+    return File(output, name=name)
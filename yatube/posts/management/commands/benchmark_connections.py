@@ -0,0 +1,139 @@
+import io
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import metrics
+from core.db.pool import PooledConnectionMixin, reset_pools
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает число запросов в секунду без пула соединений, когда '
+        'каждый запрос открывает новое соединение с базой, и с пулом. '
+        'Запросы проходят через WSGI-обработчик Django в нескольких '
+        'потоках, как в воркере gunicorn с --threads. Разница больше всего '
+        'на PostgreSQL, где установка соединения дорогая.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/')
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Сколько запросов отправить в каждом режиме.')
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument(
+            '--pool-size', type=int, default=None,
+            help='Размер пула, по умолчанию DB_POOL_SIZE из настроек.')
+
+    def handle(self, *args, **options):
+        connection = connections[DEFAULT_DB_ALIAS]
+        if not isinstance(connection, PooledConnectionMixin):
+            raise CommandError(
+                'Пул есть только у бэкендов core.db.postgresql '
+                'и core.db.sqlite3, задайте DB_ENGINE')
+        settings_dict = connection.settings_dict
+        saved = settings_dict['CONN_MAX_AGE'], settings_dict.get('POOL', {})
+        pool_size = options['pool_size'] or saved[1].get(
+            'SIZE') or options['threads']
+        self.handler = WSGIHandler()
+        # Соединения команды не должны занимать место в пуле.
+        connection.close()
+        results = {}
+        try:
+            for title, size in (('без пула', 0), ('с пулом', pool_size)):
+                settings_dict['CONN_MAX_AGE'] = 0
+                settings_dict['POOL'] = {**saved[1], 'SIZE': size}
+                reset_pools()
+                self.run(options, 'прогрев')
+                results[title] = self.run(options, title)
+        finally:
+            settings_dict['CONN_MAX_AGE'], settings_dict['POOL'] = saved
+            reset_pools()
+        plain, pooled = results['без пула'], results['с пулом']
+        self.stdout.write(
+            f'Ускорение: {pooled["rps"] / plain["rps"]:.2f}x, '
+            f'пул на {pool_size} соединений')
+        waits = metrics.DB_POOL_WAIT.values.get((DEFAULT_DB_ALIAS,))
+        if waits:
+            self.stdout.write(
+                f'Ожидание пула: {waits[1] / waits[2] * 1000:.3f} мс '
+                f'в среднем на {waits[2]} выдач')
+        reconnects = metrics.DB_RECONNECTS.values.get((DEFAULT_DB_ALIAS,), 0)
+        self.stdout.write(f'Переподключений: {reconnects}')
+
+    def environ(self, url):
+        path, _, query = url.partition('?')
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else (
+            'localhost')
+        return {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'HTTP_HOST': host,
+            'REMOTE_ADDR': '127.0.0.1',
+            # Cookie сессии выключает кэш страниц для гостей, и каждый
+            # запрос доходит до базы хотя бы за сессией.
+            'HTTP_COOKIE': f'{settings.SESSION_COOKIE_NAME}=benchmark',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': io.StringIO(),
+            'wsgi.url_scheme': 'http',
+        }
+
+    def request(self, url):
+        statuses = []
+        response = self.handler(
+            self.environ(url),
+            lambda status, headers: statuses.append(status))
+        try:
+            b''.join(response)
+        finally:
+            # Как и WSGI-сервер, закрытие ответа вызывает request_finished,
+            # и Django закрывает или возвращает в пул соединение потока.
+            response.close()
+        if not statuses[0].startswith('200'):
+            raise CommandError(f'{url} ответил {statuses[0]}')
+
+    def run(self, options, title):
+        count, threads = options['requests'], max(options['threads'], 1)
+        latencies, errors = [], []
+
+        def worker(share):
+            try:
+                for _ in range(share):
+                    started = time.perf_counter()
+                    self.request(options['url'])
+                    latencies.append(time.perf_counter() - started)
+            except Exception as error:
+                errors.append(error)
+
+        workers = [
+            threading.Thread(
+                target=worker,
+                args=(count // threads + (number < count % threads),))
+            for number in range(threads)
+        ]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        if errors:
+            raise CommandError(errors[0])
+        result = {
+            'rps': len(latencies) / elapsed,
+            'latency': statistics.mean(latencies) * 1000,
+        }
+        if title != 'прогрев':
+            self.stdout.write(
+                f'{title}: {result["rps"]:.1f} запросов/с, '
+                f'в среднем {result["latency"]:.2f} мс')
+        return result
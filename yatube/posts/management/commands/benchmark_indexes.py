@@ -0,0 +1,102 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+
+from posts.models import Comment, Follow, Group, Post, UserCounter
+from posts.paginator import POSTS_PER_PAGE
+
+FEED_ORDERING = ('-pub_date', '-id')
+
+# Составные индексы, которые сравнивает команда.
+INDEXES = {
+    Post: ('post_author_pub_date_idx', 'post_group_pub_date_idx'),
+    Comment: ('comment_post_created_idx',),
+    Follow: ('follow_user_author_idx',),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает планы и время запросов лент без составных индексов '
+        'и с ними. Индексы удаляются внутри транзакции, которая затем '
+        'откатывается, поэтому таблицы на время замера блокируются: '
+        'запускайте на копии базы с тестовыми данными.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Сколько раз выполнять каждый запрос.')
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='EXPLAIN ANALYZE (только PostgreSQL).')
+
+    def handle(self, *args, **options):
+        queries = self.queries()
+        if not queries:
+            self.stdout.write('В базе нет данных для замеров')
+            return
+        with transaction.atomic():
+            self.drop_indexes()
+            before = self.measure(queries, options, 'без индексов')
+            transaction.set_rollback(True)
+        after = self.measure(queries, options, 'с индексами')
+        self.stdout.write('\nИтог, медиана в мс:')
+        for name in queries:
+            self.stdout.write(
+                f'{name}: {before[name]:.2f} -> {after[name]:.2f}')
+
+    def queries(self):
+        """Запросы лент для самых нагруженных автора, группы и поста."""
+        queries = {}
+        author = UserCounter.objects.order_by(
+            '-posts_count').values_list('user_id', flat=True).first()
+        if author is not None:
+            queries['Лента профиля'] = Post.objects.filter(
+                author_id=author).order_by(*FEED_ORDERING)[:POSTS_PER_PAGE]
+        group = Group.objects.annotate(size=Count('posts')).order_by(
+            '-size').values_list('pk', flat=True).first()
+        if group is not None:
+            queries['Лента группы'] = Post.objects.filter(
+                group_id=group).order_by(*FEED_ORDERING)[:POSTS_PER_PAGE]
+        post = Post.objects.order_by('-comments_count').values_list(
+            'pk', flat=True).first()
+        if post is not None:
+            queries['Комментарии поста'] = Comment.objects.filter(
+                post_id=post).order_by('-created', '-id')
+        follow = Follow.objects.values_list('user_id', 'author_id').first()
+        if follow is not None:
+            user, author = follow
+            queries['Проверка подписки'] = Follow.objects.filter(
+                user_id=user, author_id=author)
+            queries['Подписки пользователя'] = Follow.objects.filter(
+                user_id=user).values_list('author_id', flat=True)
+        return queries
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for names in INDEXES.values():
+                for name in names:
+                    cursor.execute(
+                        f'DROP INDEX {connection.ops.quote_name(name)}')
+
+    def measure(self, queries, options, title):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n{title}'))
+        explain_options = {}
+        if options['analyze'] and connection.vendor == 'postgresql':
+            explain_options = {'analyze': True, 'buffers': True}
+        timings = {}
+        for name, queryset in queries.items():
+            self.stdout.write(self.style.MIGRATE_LABEL(name))
+            self.stdout.write(queryset.explain(**explain_options))
+            samples = []
+            for _ in range(max(options['repeat'], 1)):
+                started = time.perf_counter()
+                list(queryset.all())
+                samples.append((time.perf_counter() - started) * 1000)
+            timings[name] = statistics.median(samples)
+            self.stdout.write(f'медиана {timings[name]:.2f} мс')
+        return timings
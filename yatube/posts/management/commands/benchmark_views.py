@@ -0,0 +1,206 @@
+import math
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import resize, search
+from posts.models import Group, Post, UserCounter
+from posts.paginator import CursorPaginator
+
+User = get_user_model()
+
+PERCENTILES = (50, 95, 99)
+SEARCH_QUERIES = ('город', 'кот', 'погода', 'море', 'новый концерт')
+# Ширина и кадр картинки как на странице поста.
+IMAGE_WIDTH = 960
+IMAGE_CROP = '960x339'
+
+
+def search_cursors(queries):
+    """Курсоры вторых страниц поиска для запросов, у которых они есть."""
+    cursors = []
+    for query in queries:
+        posts = search.search(query, Post.objects.for_feed())
+        paginator = CursorPaginator(
+            posts.order_by(*search.SEARCH_ORDERING),
+            ordering=search.SEARCH_ORDERING)
+        paginator.get_page(None)
+        if paginator.next_cursor:
+            cursors.append((query, paginator.next_cursor))
+    return cursors
+
+
+def percentile(samples, percent):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Проходит по всем адресам приложения posts и печатает p50/p95/p99 '
+        'времени ответа, среднее число SQL-запросов и размер ответа. '
+        'Изменяющие данные запросы выполняются в откатываемой транзакции.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Сколько запросов отправить на каждый адрес.')
+        parser.add_argument(
+            '--samples', type=int, default=20,
+            help='Сколько разных авторов, групп и постов перебирать.')
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        samples = options['samples']
+        authors = list(UserCounter.objects.order_by(
+            '-posts_count').values_list('user__username', flat=True)[:samples])
+        reader = User.objects.order_by('-counters__following_count').first()
+        posts = list(Post.objects.order_by('-comments_count').values_list(
+            'pk', 'author_id')[:samples])
+        groups = list(Group.objects.order_by('pk').values_list(
+            'slug', flat=True)[:samples])
+        images = [
+            resize.url(name, IMAGE_WIDTH, IMAGE_CROP)
+            for name in Post.objects.exclude(image='').order_by(
+                '-pub_date').values_list('image', flat=True)[:samples]
+        ]
+        cursors = search_cursors(SEARCH_QUERIES)
+        if not (authors and reader and posts):
+            raise CommandError(
+                'Нет данных для замеров, сначала запустите seed_dataset')
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else None
+        defaults = {'HTTP_HOST': host} if host else {}
+        anonymous = Client(**defaults)
+        logged_in = Client(**defaults)
+        logged_in.force_login(reader)
+        # Редактировать пост может только его автор.
+        author_clients = {}
+        for user in User.objects.filter(pk__in={pk for _, pk in posts}):
+            author_clients[user.pk] = Client(**defaults)
+            author_clients[user.pk].force_login(user)
+        # Метки since берутся из первого ответа, как это делает страница.
+        new_posts_url = reverse('posts:new_posts')
+        since = {}
+        if settings.NEW_POSTS_ENABLED:
+            since['index'] = anonymous.get(new_posts_url).json()['since']
+            since['follow'] = logged_in.get(
+                new_posts_url, {'feed': 'follow'}).json()['since']
+
+        def edit_request():
+            post_id, author_id = pick(posts)
+            url = reverse('posts:post_edit', args=[post_id])
+            return author_clients[author_id], 'get', url, {}
+
+        def pick(items):
+            return items[rng.randrange(len(items))]
+
+        routes = {
+            'index': lambda: (anonymous, 'get', reverse('posts:index'), {}),
+            'group_posts': lambda: (
+                anonymous, 'get',
+                reverse('posts:group_posts', args=[pick(groups)]), {}),
+            'profile': lambda: (
+                anonymous, 'get',
+                reverse('posts:profile', args=[pick(authors)]), {}),
+            'post_detail': lambda: (
+                anonymous, 'get',
+                reverse('posts:post_detail', args=[pick(posts)[0]]), {}),
+            'post_comments': lambda: (
+                anonymous, 'get',
+                reverse('posts:post_comments', args=[pick(posts)[0]]), {}),
+            'search': lambda: (
+                anonymous, 'get', reverse('posts:search'),
+                {'q': pick(SEARCH_QUERIES)}),
+            'search_cursor': lambda: (
+                anonymous, 'get', reverse('posts:search'),
+                dict(zip(('q', 'cursor'), pick(cursors)))),
+            'new_posts': lambda: (
+                anonymous, 'get', new_posts_url,
+                {'since': since['index'], 'wait': 0}),
+            'new_posts_follow': lambda: (
+                logged_in, 'get', new_posts_url,
+                {'feed': 'follow', 'since': since['follow'], 'wait': 0}),
+            'image_resize': lambda: (
+                anonymous, 'get', pick(images), {}),
+            'create': lambda: (
+                logged_in, 'get', reverse('posts:create'), {}),
+            'post_edit': edit_request,
+            'add_comment': lambda: (
+                logged_in, 'post',
+                reverse('posts:add_comment', args=[pick(posts)[0]]),
+                {'text': 'Комментарий для замера'}),
+            'follow_index': lambda: (
+                logged_in, 'get', reverse('posts:follow_index'), {}),
+            'profile_follow': lambda: (
+                logged_in, 'get',
+                reverse('posts:profile_follow', args=[pick(authors)]), {}),
+            'profile_unfollow': lambda: (
+                logged_in, 'get',
+                reverse('posts:profile_unfollow', args=[pick(authors)]), {}),
+        }
+        # Адреса, для которых в наборе нет данных, пропускаются.
+        available = {
+            'group_posts': groups,
+            'search_cursor': cursors,
+            'new_posts': since,
+            'new_posts_follow': since,
+            'image_resize': images,
+        }
+        routes = {
+            name: make_request for name, make_request in routes.items()
+            if available.get(name, True)
+        }
+        self.stdout.write(
+            f'{"адрес":<18}{"p50":>9}{"p95":>9}{"p99":>9}'
+            f'{"запросов":>10}{"байт":>10}')
+        for name, make_request in routes.items():
+            stats = self.measure(make_request, options)
+            self.stdout.write(
+                f'{name:<18}'
+                + ''.join(f'{stats[percent]:>9.1f}' for percent in PERCENTILES)
+                + f'{stats["queries"]:>10.1f}{stats["bytes"]:>10.0f}')
+        self.stdout.write('Время в миллисекундах')
+
+    def measure(self, make_request, options):
+        latencies, queries, sizes = [], [], []
+        for _ in range(max(options['requests'], 1)):
+            client, method, url, data = make_request()
+            if options['cold']:
+                cache.clear()
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = getattr(client, method)(url, data)
+                    latencies.append(
+                        (time.perf_counter() - started) * 1000)
+                transaction.set_rollback(True)
+            if response.status_code >= 400:
+                raise CommandError(f'{url} ответил {response.status_code}')
+            queries.append(len(captured))
+            if response.streaming:
+                sizes.append(sum(map(len, response.streaming_content)))
+                response.close()
+            else:
+                sizes.append(len(response.content))
+        stats = {
+            percent: percentile(latencies, percent)
+            for percent in PERCENTILES
+        }
+        stats['queries'] = statistics.mean(queries)
+        stats['bytes'] = statistics.mean(sizes)
+        return stats
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters, timeline
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счетчики постов, комментариев и подписок и сверяет '
+        'с ними раскладку лент подписок.'
+    )
+
+    def handle(self, *args, **options):
+        fixed = counters.rebuild()
+        timeline.reconcile_all()
+        for name, rows in fixed.items():
+            self.stdout.write(f'{name}: исправлено строк {rows}')
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
@@ -0,0 +1,288 @@
+import io
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image
+
+from posts import counters, feed_cache, search, timeline
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+
+User = get_user_model()
+
+USERNAME_PREFIX = 'seed_'
+GROUP_SLUG_PREFIX = 'seed-'
+IMAGE_NAME = 'posts/seed_{}.jpg'
+IMAGE_FILES = 8
+
+FIRST_NAMES = (
+    'Анна', 'Иван', 'Мария', 'Петр', 'Ольга', 'Сергей', 'Елена', 'Дмитрий',
+    'Наталья', 'Алексей', 'Татьяна', 'Михаил',
+)
+LAST_NAMES = (
+    'Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Соколов',
+    'Новиков', 'Федоров', 'Морозов', 'Волков',
+)
+WORDS = (
+    'город', 'река', 'прогулка', 'кот', 'собака', 'утро', 'вечер', 'книга',
+    'музыка', 'кино', 'поезд', 'море', 'лес', 'погода', 'работа', 'друзья',
+    'фотография', 'дорога', 'зима', 'лето', 'осень', 'весна', 'кофе',
+    'новости', 'путешествие', 'горы', 'сад', 'концерт', 'выставка', 'ужин',
+    'сегодня', 'вчера', 'очень', 'снова', 'наконец', 'красивый', 'старый',
+    'новый', 'большой', 'тихий', 'увидел', 'прочитал', 'написал', 'нашел',
+)
+
+
+def skewed_index(rng, size, skew):
+    """Индекс от 0 до size - 1 со степенным перекосом к началу.
+
+    При skew=1 распределение равномерное, чем больше skew, тем сильнее
+    первые элементы (популярные авторы, горячие группы, свежие посты)
+    собирают основную часть выборок.
+    """
+    return min(int(size * rng.random() ** skew), size - 1)
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Отключает auto_now_add, чтобы сохранить сгенерированные даты."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу воспроизводимым набором данных для замеров: '
+        'пользователи с перекошенным числом подписчиков, горячие группы, '
+        'посты с картинками и комментарии. Данные пишутся пачками через '
+        'bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок пользователя.')
+        parser.add_argument(
+            '--images', type=float, default=0.1,
+            help='Доля постов с картинкой.')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределить посты.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить ранее созданные данные и выйти.')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.clear()
+            return
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now().replace(microsecond=0)
+        self.days = options['days']
+        users = self.create_users(options['users'])
+        groups = self.create_groups(options['groups'])
+        images = self.create_images() if options['images'] > 0 else []
+        first_post = self.create_posts(
+            options['posts'], users, groups, images, options['images'])
+        self.create_comments(options['comments'], users, first_post)
+        # bulk_create не отправляет сигналов, поэтому индекс поиска
+        # в памяти процесса собирается заново.
+        search.index.reset()
+        self.create_follows(users, options['follows'])
+        fixed = counters.rebuild()
+        timeline.reconcile_all()
+        self.stdout.write(f'Счетчики пересчитаны: {fixed}')
+        if first_post is not None:
+            self.fill_timelines(first_post)
+        feed_cache.bump(feed_cache.index_feed())
+        self.stdout.write(self.style.SUCCESS('Данные созданы'))
+        if images:
+            self.stdout.write(
+                'Миниатюры картинок можно создать командой warm_thumbnails')
+
+    def clear(self):
+        with transaction.atomic():
+            Post.objects.filter(
+                author__username__startswith=USERNAME_PREFIX).delete()
+            User.objects.filter(
+                username__startswith=USERNAME_PREFIX).delete()
+            Group.objects.filter(slug__startswith=GROUP_SLUG_PREFIX).delete()
+        self.stdout.write(self.style.SUCCESS('Данные удалены'))
+
+    def bulk_create(self, model, objects, **kwargs):
+        """Сохраняет объекты пачками по batch_size, не держа их в памяти."""
+        batch, total = [], 0
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                model.objects.bulk_create(batch, **kwargs)
+                total += len(batch)
+                batch = []
+                self.stdout.write(f'{model.__name__}: {total}')
+        if batch:
+            model.objects.bulk_create(batch, **kwargs)
+            total += len(batch)
+        self.stdout.write(f'{model.__name__}: {total}')
+
+    def random_date(self):
+        # Свежих постов больше, чем старых.
+        seconds = skewed_index(self.rng, self.days * 24 * 3600, 2)
+        return self.now - timedelta(seconds=seconds)
+
+    def random_text(self, low, high):
+        words = self.rng.choices(WORDS, k=self.rng.randint(low, high))
+        return ' '.join(words).capitalize()
+
+    def create_users(self, count):
+        self.bulk_create(User, (
+            User(
+                username=f'{USERNAME_PREFIX}{number}',
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                password=UNUSABLE_PASSWORD_PREFIX,
+            )
+            for number in range(count)
+        ))
+        users = list(User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).order_by('pk').values_list('pk', flat=True))
+        # Популярность не должна совпадать с порядком pk.
+        self.rng.shuffle(users)
+        return users
+
+    def create_groups(self, count):
+        self.bulk_create(Group, (
+            Group(
+                title=f'Группа {number}',
+                slug=f'{GROUP_SLUG_PREFIX}{number}',
+                description=self.random_text(5, 20),
+            )
+            for number in range(count)
+        ))
+        return list(Group.objects.filter(
+            slug__startswith=GROUP_SLUG_PREFIX
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def create_images(self):
+        names = []
+        for number in range(IMAGE_FILES):
+            name = IMAGE_NAME.format(number)
+            if not default_storage.exists(name):
+                # Отдельный генератор: наличие файлов не должно менять
+                # последовательность остальных данных.
+                colors = random.Random(number)
+                color = tuple(colors.randrange(256) for _ in range(3))
+                buffer = io.BytesIO()
+                Image.new('RGB', (1280, 720), color).save(buffer, 'JPEG')
+                name = default_storage.save(
+                    name, ContentFile(buffer.getvalue()))
+            names.append(name)
+        return names
+
+    def create_posts(self, count, users, groups, images, image_share):
+        def posts():
+            for _ in range(count):
+                group = None
+                if groups and self.rng.random() < 0.7:
+                    group = groups[skewed_index(self.rng, len(groups), 3)]
+                image = ''
+                if images and self.rng.random() < image_share:
+                    image = self.rng.choice(images)
+                yield Post(
+                    author_id=users[skewed_index(self.rng, len(users), 3)],
+                    group_id=group,
+                    text=self.random_text(5, 60),
+                    image=image,
+                    pub_date=self.random_date(),
+                )
+
+        last = Post.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            self.bulk_create(Post, posts())
+        return Post.objects.filter(pk__gt=last).order_by('pk').values_list(
+            'pk', flat=True).first()
+
+    def create_comments(self, count, users, first_post):
+        if first_post is None:
+            return
+        last_post = Post.objects.order_by('-pk').values_list(
+            'pk', flat=True).first()
+        size = last_post - first_post + 1
+
+        def comments():
+            for _ in range(count):
+                yield Comment(
+                    post_id=first_post + skewed_index(self.rng, size, 4),
+                    author_id=self.rng.choice(users),
+                    text=self.random_text(2, 25),
+                    created=self.random_date(),
+                )
+
+        with explicit_dates(Comment._meta.get_field('created')):
+            self.bulk_create(Comment, comments())
+
+    def create_follows(self, users, average):
+        def follows():
+            for user in users:
+                wanted = min(
+                    int(self.rng.expovariate(1 / average)) if average else 0,
+                    len(users) - 1,
+                )
+                authors = set()
+                while len(authors) < wanted:
+                    author = users[skewed_index(self.rng, len(users), 4)]
+                    if author != user:
+                        authors.add(author)
+                for author in sorted(authors):
+                    yield Follow(user_id=user, author_id=author)
+
+        self.bulk_create(Follow, follows(), ignore_conflicts=True)
+
+    def fill_timelines(self, first_post):
+        """Раскладывает новые посты по лентам одним INSERT ... SELECT.
+
+        Посты авторов, которых timeline.feed подмешивает при чтении,
+        в ленты не попадают, как и при обычной публикации.
+        """
+        cache.delete(timeline.PULL_AUTHORS_KEY)
+        pulled = timeline.pull_authors()
+        qn = connection.ops.quote_name
+        entry_table = qn(TimelineEntry._meta.db_table)
+        post_table = qn(Post._meta.db_table)
+        follow_table = qn(Follow._meta.db_table)
+        sql = (
+            f'INSERT INTO {entry_table} (user_id, post_id, author_id, '
+            f'pub_date) SELECT f.user_id, p.id, p.author_id, p.pub_date '
+            f'FROM {follow_table} f JOIN {post_table} p '
+            f'ON p.author_id = f.author_id WHERE p.id >= %s'
+        )
+        params = [first_post]
+        if pulled:
+            sql += ' AND p.author_id NOT IN ({})'.format(
+                ', '.join(['%s'] * len(pulled)))
+            params += sorted(pulled)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            self.stdout.write(f'TimelineEntry: {cursor.rowcount}')
@@ -0,0 +1,41 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import feed_cache, thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Создает миниатюры для картинок существующих постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Число процессов (по умолчанию — число ядер).'
+        )
+
+    def handle(self, *args, **options):
+        posts = defaultdict(list)
+        images = Post.objects.exclude(image='').values_list('id', 'image')
+        for post_id, name in images.iterator():
+            posts[name].append(post_id)
+        names = list(posts)
+        # Дочерние процессы должны открыть собственные соединения с БД.
+        connections.close_all()
+        done = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            for name, generated in zip(
+                    names, pool.map(thumbnails.generate, names,
+                                    chunksize=16)):
+                thumbnails.remember(posts[name], name, generated)
+                done += bool(generated)
+        # Фрагменты профилей и групп обновятся по FEED_CACHE_TIMEOUT.
+        feed_cache.bump(feed_cache.index_feed())
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово миниатюр: {done} из {len(names)}'))
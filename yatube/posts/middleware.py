@@ -0,0 +1,64 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from . import feed_cache, view_counts
+
+PAGE_KEY = 'page:{}'
+
+
+class AnonymousPageCacheMiddleware:
+    """Кэш целых страниц для гостей.
+
+    Запрос без cookie сессии отдается из кэша, минуя сессии,
+    аутентификацию, сообщения и отрисовку шаблона. Копия страницы хранится
+    вместе с версиями лент, которые она показывает (их записывает
+    feed_condition), и считается свежей, пока эти версии не изменились,
+    поэтому правки постов, комментариев и групп видны сразу.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.is_guest_read(request):
+            return self.get_response(request)
+        key = PAGE_KEY.format(hashlib.md5(
+            (request.get_host() + request.get_full_path()).encode()
+        ).hexdigest())
+        entry = cache.get(key)
+        if entry is not None:
+            versions, response = entry
+            if feed_cache.versions(*versions) == versions:
+                view_counts.record_cached(response)
+                return get_conditional_response(
+                    request,
+                    etag=response.get('ETag'),
+                    last_modified=parse_http_date_safe(
+                        response.get('Last-Modified', '')),
+                    response=response,
+                )
+        response = self.get_response(request)
+        if self.is_cacheable(request, response):
+            cache.set(
+                key,
+                (request.page_cache_versions, response),
+                settings.PAGE_CACHE_TIMEOUT,
+            )
+        return response
+
+    @staticmethod
+    def is_guest_read(request):
+        return (request.method in ('GET', 'HEAD')
+                and settings.SESSION_COOKIE_NAME not in request.COOKIES)
+
+    @staticmethod
+    def is_cacheable(request, response):
+        return (request.method == 'GET'
+                and getattr(request, 'page_cache_versions', None)
+                and response.status_code == 200
+                and not response.streaming
+                and not response.cookies)
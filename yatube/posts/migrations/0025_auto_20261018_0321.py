@@ -0,0 +1,65 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_timelines(apps, schema_editor):
+    """Раскладывает последние посты авторов по лентам подписчиков.
+
+    Один INSERT ... SELECT: номер поста среди постов автора считается
+    оконной функцией, поэтому в ленту попадает не больше
+    TIMELINE_BACKFILL_LIMIT постов каждого автора.
+    """
+    qn = schema_editor.connection.ops.quote_name
+    entry_table = qn(apps.get_model('posts', 'TimelineEntry')._meta.db_table)
+    post_table = qn(apps.get_model('posts', 'Post')._meta.db_table)
+    follow_table = qn(apps.get_model('posts', 'Follow')._meta.db_table)
+    schema_editor.execute(
+        f'INSERT INTO {entry_table} (user_id, post_id, author_id, pub_date) '
+        f'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+        f'FROM {follow_table} f JOIN ('
+        f'SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+        f'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+        f') AS position FROM {post_table}'
+        f') p ON p.author_id = f.author_id WHERE p.position <= %s',
+        [settings.TIMELINE_BACKFILL_LIMIT],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0024_auto_20211005_1750'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-pub_date',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date'], name='timeline_user_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'author'], name='timeline_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_post'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
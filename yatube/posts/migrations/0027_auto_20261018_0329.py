@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0026_auto_20261018_0323'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostThumbnail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=32, verbose_name='Размер')),
+                ('source', models.CharField(max_length=255, verbose_name='Исходная картинка')),
+                ('url', models.CharField(max_length=255, verbose_name='Адрес')),
+                ('width', models.PositiveIntegerField(verbose_name='Ширина')),
+                ('height', models.PositiveIntegerField(verbose_name='Высота')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='thumbnails', to='posts.Post')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='postthumbnail',
+            constraint=models.UniqueConstraint(fields=('post', 'alias'), name='unique_post_thumbnail'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+INDEXES = (
+    ('posts_post_text_search_idx', 'posts_post'),
+    ('posts_comment_text_search_idx', 'posts_comment'),
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    """GIN-индексы по tsvector есть только в PostgreSQL."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin '
+            f"(to_tsvector('russian'::regconfig, COALESCE(text, '')))"
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0027_auto_20261018_0329'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
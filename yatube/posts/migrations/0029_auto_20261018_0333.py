@@ -0,0 +1,61 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:33
+
+from django.db import migrations, models
+
+
+def add_index_concurrently(model_name, index):
+    """AddIndex, который в PostgreSQL не блокирует запись в таблицу.
+
+    CREATE INDEX CONCURRENTLY нельзя выполнить в транзакции, поэтому
+    миграция не атомарная. Состояние моделей меняется как обычным AddIndex.
+    """
+    def create(apps, schema_editor):
+        model = apps.get_model('posts', model_name)
+        if schema_editor.connection.vendor != 'postgresql':
+            schema_editor.add_index(model, index)
+            return
+        sql = str(index.create_sql(model, schema_editor))
+        schema_editor.execute(
+            sql.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1))
+
+    def drop(apps, schema_editor):
+        model = apps.get_model('posts', model_name)
+        if schema_editor.connection.vendor != 'postgresql':
+            schema_editor.remove_index(model, index)
+            return
+        schema_editor.execute(
+            'DROP INDEX CONCURRENTLY IF EXISTS '
+            + schema_editor.quote_name(index.name))
+
+    return migrations.SeparateDatabaseAndState(
+        database_operations=[migrations.RunPython(create, drop)],
+        state_operations=[
+            migrations.AddIndex(model_name=model_name, index=index)],
+    )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('posts', '0028_search_indexes'),
+    ]
+
+    operations = [
+        add_index_concurrently(
+            'comment',
+            models.Index(fields=['post', '-created', '-id'], name='comment_post_created_idx'),
+        ),
+        add_index_concurrently(
+            'follow',
+            models.Index(fields=['user', 'author'], name='follow_user_author_idx'),
+        ),
+        add_index_concurrently(
+            'post',
+            models.Index(fields=['author', '-pub_date', '-id'], name='post_author_pub_date_idx'),
+        ),
+        add_index_concurrently(
+            'post',
+            models.Index(fields=['group', '-pub_date', '-id'], name='post_group_pub_date_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:21
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def mark_pulled_authors(apps, schema_editor):
+    UserCounter = apps.get_model('posts', 'UserCounter')
+    UserCounter.objects.filter(
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT
+    ).update(pulled_since=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0030_post_views_count'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='timelineentry',
+            name='timeline_user_pub_date_idx',
+        ),
+        migrations.AddField(
+            model_name='usercounter',
+            name='pulled_since',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Без раскладки с'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_user_pub_date_idx'),
+        ),
+        migrations.RunPython(mark_pulled_authors, migrations.RunPython.noop),
+    ]
@@ -25,6 +25,35 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    """Выборки постов с заранее подгруженными связями для шаблонов."""
+    FEED_FIELDS = (
+        'text',
+        'pub_date',
+        'image',
+        'comments_count',
+        'author__username',
+        'author__first_name',
+        'author__last_name',
+        'group__title',
+        'group__slug',
+    )
+
+    def for_feed(self):
+        """Посты для лент: автор и группа приходят тем же запросом,
+        миниатюры всей страницы — одним дополнительным."""
+        return self.select_related('author', 'group').only(
+            *self.FEED_FIELDS
+        ).prefetch_related('thumbnails')
+
+    def for_detail(self):
+        """Пост для отдельной страницы вместе с автором, его счетчиками,
+        группой и миниатюрами."""
+        return self.select_related(
+            'author__counters', 'group'
+        ).prefetch_related('thumbnails')
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст поста',
@@ -56,16 +85,50 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
+    # Обновляется пачками из posts.view_counts.
+    views_count = models.PositiveIntegerField(
+        'Число просмотров',
+        default=0,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Ленты группы и профиля: фильтр по группе или автору и сортировка
+        # по ключу курсора (pub_date, id) читаются одним диапазоном.
+        indexes = [
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
 
+class CommentQuerySet(models.QuerySet):
+    def for_post(self, post):
+        """Комментарии поста вместе с авторами одним запросом."""
+        return self.filter(post=post).select_related('author').only(
+            'text',
+            'created',
+            'post_id',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+        )
+
+
 class Comment(CreatedModel):
     post = models.ForeignKey(
         Post,
@@ -88,10 +151,16 @@ class Comment(CreatedModel):
         help_text='*Обязательное поле'
     )
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         ordering = ('-created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Коментарии'
+        indexes = [
+            models.Index(fields=['post', '-created', '-id'],
+                         name='comment_post_created_idx'),
+        ]
 
 
 class Follow(models.Model):
@@ -111,3 +180,104 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=['author', 'user'],
                                     name='unique_followed_author')
         ]
+        # Уникальный индекс начинается с автора; проверка «подписан ли
+        # пользователь» и список подписок идут от пользователя.
+        indexes = [
+            models.Index(fields=['user', 'author'],
+                         name='follow_user_author_idx'),
+        ]
+
+
+class PostThumbnail(models.Model):
+    """Готовая миниатюра картинки поста.
+
+    Хранит адрес и размеры, чтобы шаблоны не обращались к хранилищу
+    миниатюр и файлам при каждой отрисовке.
+    """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='thumbnails'
+    )
+    alias = models.CharField('Размер', max_length=32)
+    source = models.CharField('Исходная картинка', max_length=255)
+    url = models.CharField('Адрес', max_length=255)
+    width = models.PositiveIntegerField('Ширина')
+    height = models.PositiveIntegerField('Высота')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'alias'],
+                                    name='unique_post_thumbnail')
+        ]
+
+
+class UserCounter(models.Model):
+    """Денормализованные счетчики пользователя.
+
+    Обновляются сигналами при создании и удалении постов и подписок,
+    чтобы страницы профиля и поста не считали COUNT(*) по большим
+    таблицам. Сверка с исходными таблицами — команда rebuild_counters.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters'
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков',
+        default=0,
+        db_index=True
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+    # С какого момента посты автора подмешиваются в ленты при чтении
+    # (см. posts.timeline); пусто, пока они раскладываются при записи.
+    pulled_since = models.DateTimeField(
+        'Без раскладки с',
+        null=True,
+        blank=True,
+        editable=False
+    )
+
+    class Meta:
+        verbose_name = 'Счетчики пользователя'
+        verbose_name_plural = 'Счетчики пользователей'
+
+
+class TimelineEntry(models.Model):
+    """Запись домашней ленты подписчика.
+
+    Заполняется при публикации поста (fan-out on write), поэтому лента
+    подписок читается одним диапазоном по индексу (user, -pub_date).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date',)
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_post')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
@@ -0,0 +1,230 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+# Совпадает с индексом comment_post_created_idx.
+COMMENT_ORDERING = ('-created', '-id')
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class CursorWindow:
+    """Ленивое окно выборки одной страницы.
+
+    Запрос выполняется только при первом обращении к записям, поэтому
+    страница, чей HTML уже лежит в кэше, не стоит ни одного запроса.
+    """
+
+    def __init__(self, paginator, direction, values):
+        self.paginator = paginator
+        self.direction = direction
+        self.values = values
+        self._rows = None
+        self._objects = None
+        self.has_more = False
+
+    def _fetch(self):
+        if self._rows is not None:
+            return self._rows
+        paginator = self.paginator
+        ordering = paginator.ordering
+        if self.direction == PREVIOUS:
+            ordering = tuple(_reverse(field) for field in ordering)
+        queryset = paginator.object_list.order_by(*ordering)
+        if self.values is not None:
+            queryset = queryset.filter(
+                paginator.keyset_filter(ordering, self.values))
+        rows = list(queryset[:paginator.per_page + 1])
+        self.has_more = len(rows) > paginator.per_page
+        rows = rows[:paginator.per_page]
+        if self.direction == PREVIOUS:
+            rows.reverse()
+        self._rows = rows
+        return rows
+
+    def _objects_list(self):
+        if self._objects is None:
+            rows = self._fetch()
+            resolve = self.paginator.resolve
+            self._objects = resolve(rows) if resolve else rows
+        return self._objects
+
+    def __iter__(self):
+        return iter(self._objects_list())
+
+    def __len__(self):
+        return len(self._objects_list())
+
+    def __getitem__(self, index):
+        return self._objects_list()[index]
+
+
+class CursorPaginator(Paginator):
+    """Постраничный вывод по ключу сортировки без OFFSET и COUNT(*).
+
+    Страница выбирается условием на ключ (по умолчанию ``(pub_date, id)``),
+    поэтому стоимость запроса не зависит от глубины страницы. Соседние
+    страницы адресуются непрозрачными курсорами, номер страницы в курсоре
+    только относительный: он нужен, чтобы ``Page`` знал, есть ли
+    предыдущая страница.
+
+    Если задан resolve, страница выбирается по строкам object_list
+    (например, записям ленты), а показываются объекты, которые resolve
+    возвращает для списка строк.
+    """
+    uses_cursor = True
+
+    def __init__(self, object_list, per_page=POSTS_PER_PAGE,
+                 ordering=('-pub_date', '-id'), resolve=None):
+        super().__init__(object_list, per_page)
+        self.ordering = tuple(ordering)
+        self.resolve = resolve
+        self.cursor = None
+        self.number = 1
+        self.window = None
+
+    def get_page(self, cursor):
+        """Возвращает страницу по курсору.
+
+        Пустой или испорченный курсор ведет на первую страницу.
+        """
+        direction, values, number = NEXT, None, 1
+        if cursor:
+            try:
+                direction, values, number = self.decode_cursor(cursor)
+                self.cursor = cursor
+            except (ValueError, TypeError, ValidationError):
+                direction, values, number = NEXT, None, 1
+        self.number = number
+        self.window = CursorWindow(self, direction, values)
+        return Page(self.window, number, self)
+
+    @property
+    def has_next(self):
+        window = self.window
+        if window is None:
+            return False
+        window._fetch()
+        return window.direction == PREVIOUS or window.has_more
+
+    @property
+    def has_previous(self):
+        return self.number > 1
+
+    @property
+    def num_pages(self):
+        return self.number + 1 if self.has_next else self.number
+
+    @property
+    def next_cursor(self):
+        if not self.has_next or not self.window._fetch():
+            return None
+        return self.encode_cursor(
+            NEXT, self.window._fetch()[-1], self.number + 1)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous or not self.window._fetch():
+            return None
+        return self.encode_cursor(
+            PREVIOUS, self.window._fetch()[0], self.number - 1)
+
+    def keyset_filter(self, ordering, values):
+        """Условие «строго после ключа values» для заданной сортировки."""
+        condition = Q()
+        for position, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f'{name}__{lookup}': values[position]})
+            for previous, value in zip(ordering[:position], values):
+                step &= Q(**{previous.lstrip('-'): value})
+            condition |= step
+        return condition
+
+    def encode_cursor(self, direction, obj, number):
+        values = [
+            _serialize(_resolve(obj, field.lstrip('-')))
+            for field in self.ordering
+        ]
+        payload = json.dumps([direction, number, values]).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        padded = cursor + '=' * (-len(cursor) % 4)
+        try:
+            payload = base64.urlsafe_b64decode(padded.encode())
+            direction, number, raw = json.loads(payload.decode())
+        except (binascii.Error, UnicodeDecodeError):
+            raise ValueError('Испорченный курсор')
+        if direction not in (NEXT, PREVIOUS):
+            raise ValueError('Неизвестное направление курсора')
+        if (not isinstance(number, int) or not isinstance(raw, list)
+                or len(raw) != len(self.ordering)):
+            raise ValueError('Курсор не подходит к сортировке')
+        # Ключ сортировки не бывает пустым, а значения курсора — только
+        # строки и числа, которые выдает encode_cursor.
+        if any(isinstance(value, bool)
+               or not isinstance(value, (str, int, float))
+               for value in raw):
+            raise ValueError('Неверное значение в курсоре')
+        values = [
+            self._to_python(field.lstrip('-'), value)
+            for field, value in zip(self.ordering, raw)
+        ]
+        if any(value is None for value in values):
+            raise ValueError('Неверное значение в курсоре')
+        return direction, values, max(number, 1)
+
+    def _to_python(self, name, value):
+        model = self.object_list.model
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            if name == 'pk':
+                field = model._meta.pk
+            else:
+                return value
+        return field.to_python(value)
+
+
+def paginate(request, queryset, per_page=POSTS_PER_PAGE,
+             ordering=('-pub_date', '-id'), resolve=None):
+    """Возвращает страницу ленты для запроса.
+
+    По умолчанию используется курсор (?cursor=...). Номер страницы
+    (?page=N) оставлен как явная опция для неглубоких страниц: он работает
+    через OFFSET и COUNT(*).
+    """
+    page_number = request.GET.get('page')
+    if page_number is not None:
+        page = Paginator(
+            queryset.order_by(*ordering), per_page).get_page(page_number)
+        if resolve:
+            page.object_list = resolve(list(page.object_list))
+        return page
+    paginator = CursorPaginator(queryset, per_page, ordering, resolve)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+def _reverse(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def _resolve(obj, name):
+    for attribute in name.split('__'):
+        obj = getattr(obj, attribute)
+    return obj
+
+
+def _serialize(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
@@ -0,0 +1,298 @@
+"""Картинки постов нужной ширины, формата и кадрирования по запросу.
+
+Адрес варианта подписан (``url``), поэтому посторонний не может заказать
+произвольные размеры и нагрузить сервер. Готовые варианты хранятся
+в дисковом кэше ``RESIZE_CACHE_DIR`` объемом до ``RESIZE_CACHE_MAX_BYTES``.
+При переполнении удаляются файлы, к которым дольше всего не обращались
+(время обращения — mtime, его обновляет каждое попадание).
+
+Одновременные запросы одного варианта объединяются: в процессе картинку
+уменьшает один поток, остальные ждут его результата, а между процессами
+то же обеспечивает короткая блокировка в общем кэше.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from PIL import Image, ImageOps
+
+from .images import flatten
+
+SALT = 'posts.resize'
+FIT = 'fit'
+AUTO = 'auto'
+# Формат в адресе: (формат Pillow, тип содержимого, расширение файла).
+FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+    'webp': ('WEBP', 'image/webp', 'webp'),
+}
+CROP_RE = re.compile(r'^([1-9]\d{0,3})x([1-9]\d{0,3})$')
+LOCK_KEY = 'resize-lock:{}'
+LOCK_TIMEOUT = 30
+WAIT_INTERVAL = 0.05
+WEBP_QUALITY = 80
+
+
+def _value(name, width, crop, fmt):
+    return f'{name}:{width}:{crop}:{fmt}'
+
+
+def sign(name, width, crop=FIT, fmt=AUTO):
+    return signing.Signer(salt=SALT).signature(
+        _value(name, width, crop, fmt))
+
+
+def verify(signature, name, width, crop, fmt):
+    return constant_time_compare(signature, sign(name, width, crop, fmt))
+
+
+def is_valid(width, crop, fmt):
+    return (0 < width <= settings.IMAGE_MAX_SIDE
+            and (crop == FIT or CROP_RE.match(crop))
+            and (fmt == AUTO or fmt in FORMATS))
+
+
+def url(name, width, crop=FIT, fmt=AUTO):
+    """Подписанный адрес варианта картинки name.
+
+    crop — пропорции кадра вида ``960x339`` или ``fit``, чтобы сохранить
+    пропорции исходника; fmt — ``jpeg``, ``webp`` или ``auto``, тогда
+    формат выбирается по заголовку Accept.
+    """
+    return reverse('posts:image_resize', kwargs={
+        'signature': sign(name, width, crop, fmt),
+        'width': width,
+        'crop': crop,
+        'fmt': fmt,
+        'name': name,
+    })
+
+
+def negotiate(fmt, accept):
+    if fmt != AUTO:
+        return fmt
+    return 'webp' if 'image/webp' in accept else 'jpeg'
+
+
+def target_size(size, width, crop):
+    """Размер результата без увеличения исходника."""
+    source_width, source_height = size
+    if crop == FIT:
+        width = min(width, source_width)
+        return width, max(round(source_height * width / source_width), 1)
+    crop_width, crop_height = map(int, CROP_RE.match(crop).groups())
+    width = min(width, source_width)
+    height = round(width * crop_height / crop_width)
+    if height > source_height:
+        height = source_height
+        width = round(height * crop_width / crop_height)
+    return max(width, 1), max(height, 1)
+
+
+def render(name, width, crop, fmt, output):
+    """Уменьшает картинку name и записывает ее в файл output."""
+    with default_storage.open(name) as source_file:
+        with Image.open(source_file) as source:
+            # Квадрат по большей стороне результата подходит при любом
+            # повороте по EXIF; декодер JPEG сразу читает уменьшенный кадр.
+            side = max(target_size(source.size, width, crop))
+            source.draft('RGB', (side, side))
+            image = flatten(ImageOps.exif_transpose(source))
+    size = target_size(image.size, width, crop)
+    if crop == FIT:
+        image = image.resize(size, Image.LANCZOS)
+    else:
+        image = ImageOps.fit(image, size, Image.LANCZOS)
+    pil_format = FORMATS[fmt][0]
+    if pil_format == 'WEBP':
+        options = {'quality': WEBP_QUALITY, 'method': 4}
+    else:
+        options = {'quality': settings.IMAGE_JPEG_QUALITY,
+                   'optimize': True, 'progressive': True}
+    image.save(output, pil_format, **options)
+
+
+class DiskCache:
+    """Файлы вариантов с вытеснением давно не читанных."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.size = None
+
+    def path(self, key, extension):
+        return os.path.join(self.directory, key[:2], f'{key}.{extension}')
+
+    def open(self, path):
+        """Открывает файл варианта и отмечает обращение к нему."""
+        file = open(path, 'rb')
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return file
+
+    def store(self, path, write):
+        """Записывает вариант функцией write(файл) атомарной заменой."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temporary = tempfile.mkstemp(
+            dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as output:
+                write(output)
+            os.replace(temporary, path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+        written = os.path.getsize(path)
+        with self.lock:
+            if self.size is None:
+                self.size = self.scan()[1]
+            else:
+                self.size += written
+            full = self.size > self.max_bytes
+        if full:
+            self.evict()
+
+    def scan(self):
+        """Файлы кэша от давних к свежим и их общий размер."""
+        files, total = [], 0
+        if not os.path.isdir(self.directory):
+            return files, total
+        for folder in os.scandir(self.directory):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        files.sort()
+        return files, total
+
+    def evict(self):
+        """Удаляет давние файлы, пока кэш не станет меньше 90% предела."""
+        with self.lock:
+            files, total = self.scan()
+            limit = self.max_bytes * 0.9
+            for _, size, path in files:
+                if total <= limit:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self.size = total
+
+
+class Coalescer:
+    """Объединяет одновременные вызовы с одним ключом в один."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def run(self, key, func):
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+        if not leader:
+            return future.result(LOCK_TIMEOUT)
+        try:
+            result = func()
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+
+_disk_cache = None
+_disk_cache_lock = threading.Lock()
+coalescer = Coalescer()
+
+
+def get_disk_cache():
+    global _disk_cache
+    with _disk_cache_lock:
+        if (_disk_cache is None
+                or _disk_cache.directory != settings.RESIZE_CACHE_DIR):
+            _disk_cache = DiskCache(
+                settings.RESIZE_CACHE_DIR, settings.RESIZE_CACHE_MAX_BYTES)
+        return _disk_cache
+
+
+def open_variant(name, width, crop, fmt):
+    """Открытый файл варианта; уменьшает картинку, если его нет в кэше.
+
+    Если исходника нет в хранилище или его не удается прочитать (файл
+    обрезан, формат не распознан), поднимает OSError.
+    """
+    disk_cache = get_disk_cache()
+    key = hashlib.sha256(_value(name, width, crop, fmt).encode()).hexdigest()
+    path = disk_cache.path(key, FORMATS[fmt][2])
+    try:
+        return disk_cache.open(path)
+    except FileNotFoundError:
+        pass
+
+    def create():
+        if os.path.exists(path):
+            return
+        lock_key = LOCK_KEY.format(key)
+        token = uuid.uuid4().hex
+        locked = cache.add(lock_key, token, LOCK_TIMEOUT)
+        if not locked:
+            if _wait_for_other_process(lock_key, path):
+                return
+            # Другой процесс не справился: создаем вариант сами.
+            locked = cache.add(lock_key, token, LOCK_TIMEOUT)
+        try:
+            disk_cache.store(
+                path, lambda output: render(name, width, crop, fmt, output))
+        finally:
+            # Чужую блокировку не снимаем: ее мог взять процесс, который
+            # создает вариант параллельно.
+            if locked and cache.get(lock_key) == token:
+                cache.delete(lock_key)
+
+    coalescer.run(key, create)
+    return disk_cache.open(path)
+
+
+def _wait_for_other_process(lock_key, path):
+    """Ждет вариант, который создает другой процесс.
+
+    Возвращает False, если не дождался: блокировка снята или истекла.
+    """
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        if os.path.exists(path):
+            return True
+        if cache.get(lock_key) is None:
+            break
+    return False
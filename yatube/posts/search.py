@@ -0,0 +1,244 @@
+"""Полнотекстовый поиск по постам и комментариям к ним.
+
+В PostgreSQL поиск идет по tsvector с русской морфологией. Тексты постов
+и комментариев покрыты GIN-индексами по выражению
+``to_tsvector('russian', text)`` (миграция 0028), поэтому база сама
+обновляет индекс при каждом сохранении или правке записи.
+
+Для SQLite (тесты, локальный запуск) есть запасной инвертированный индекс
+в памяти процесса с упрощенным русским стеммером. Его обновляют сигналы
+сохранения и удаления постов и комментариев, а найденные кандидаты перед
+выдачей сверяются с базой, поэтому устаревшие записи индекса в выдачу
+не попадают.
+
+Результаты — посты с аннотацией ``rank``; сортировка ``SEARCH_ORDERING``
+годится для постраничного вывода по ключу.
+"""
+import math
+import re
+import threading
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import (Case, FloatField, OuterRef, Q, Subquery,
+                              Sum, Value, When)
+from django.db.models.functions import Cast, Coalesce
+
+from .models import Comment, Post
+
+SEARCH_CONFIG = 'russian'
+SEARCH_ORDERING = ('-rank', '-id')
+
+# Совпадение в комментарии весит меньше совпадения в тексте поста.
+POST_WEIGHT = 1.0
+COMMENT_WEIGHT = 0.4
+
+WORD_RE = re.compile(r'\w+')
+MIN_STEM_LENGTH = 3
+SUFFIXES = sorted((
+    'иями', 'ями', 'ами', 'ией', 'ием', 'иях', 'ого', 'его', 'ому', 'ему',
+    'ыми', 'ими', 'ешь', 'ете', 'ить', 'ать', 'ять', 'еть', 'уть', 'ться',
+    'ов', 'ев', 'ей', 'ий', 'ый', 'ой', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие',
+    'ых', 'их', 'ым', 'им', 'ую', 'юю', 'ом', 'ем', 'ах', 'ях', 'ет', 'ют',
+    'ут', 'ит', 'ат', 'ят', 'ла', 'ло', 'ли', 'ть',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й', 'л',
+), key=len, reverse=True)
+
+
+def stem(word):
+    """Отрезает типичное русское окончание, оставляя основу."""
+    word = word.lower().replace('ё', 'е')
+    for suffix in SUFFIXES:
+        if (word.endswith(suffix)
+                and len(word) - len(suffix) >= MIN_STEM_LENGTH):
+            return word[:-len(suffix)]
+    return word
+
+
+def terms(text):
+    """Основы слов текста в порядке появления."""
+    return [stem(word) for word in WORD_RE.findall(text or '')]
+
+
+class InvertedIndex:
+    """Инвертированный индекс постов и комментариев в памяти процесса.
+
+    Документ — пост или комментарий, ключ документа ``(вид, pk)``.
+    Комментарий найденного документа засчитывается его посту.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.built = False
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        self.by_post = defaultdict(set)
+
+    def build(self):
+        """Заполняет индекс всеми постами и комментариями из базы."""
+        with self.lock:
+            if self.built:
+                return
+            self._load(Post.objects.all(), Comment.objects.all())
+            self.built = True
+
+    def reset(self):
+        """Очищает индекс; следующий поиск заполнит его заново."""
+        with self.lock:
+            self.built = False
+            self.postings.clear()
+            self.documents.clear()
+            self.by_post.clear()
+
+    def _load(self, posts, comments):
+        for pk, text in posts.values_list('pk', 'text').iterator():
+            self._add(('post', pk), pk, text)
+        rows = comments.values_list('pk', 'post_id', 'text').iterator()
+        for pk, post_id, text in rows:
+            self._add(('comment', pk), post_id, text)
+
+    def _add(self, key, post_id, text):
+        self._discard(key)
+        counts = defaultdict(int)
+        for term in terms(text):
+            counts[term] += 1
+        for term, count in counts.items():
+            self.postings[term][key] = count
+        self.documents[key] = (post_id, tuple(counts))
+        self.by_post[post_id].add(key)
+
+    def _discard(self, key):
+        document = self.documents.pop(key, None)
+        if document is None:
+            return
+        post_id, document_terms = document
+        for term in document_terms:
+            self.postings[term].pop(key, None)
+            if not self.postings[term]:
+                del self.postings[term]
+        self.by_post[post_id].discard(key)
+        if not self.by_post[post_id]:
+            del self.by_post[post_id]
+
+    def add(self, kind, pk, post_id, text):
+        with self.lock:
+            if self.built:
+                self._add((kind, pk), post_id, text)
+
+    def discard(self, kind, pk):
+        with self.lock:
+            if self.built:
+                self._discard((kind, pk))
+
+    def refresh(self, post_ids):
+        """Перечитывает из базы посты post_ids вместе с комментариями."""
+        with self.lock:
+            for post_id in post_ids:
+                for key in list(self.by_post.get(post_id, ())):
+                    self._discard(key)
+            self._load(
+                Post.objects.filter(pk__in=post_ids),
+                Comment.objects.filter(post_id__in=post_ids),
+            )
+
+    def score(self, query_terms):
+        """Возвращает {post_id: вес} постов, где есть все слова запроса."""
+        with self.lock:
+            total = len(self.by_post) or 1
+            scores = None
+            for term in set(query_terms):
+                found = defaultdict(float)
+                for key, count in self.postings.get(term, {}).items():
+                    weight = POST_WEIGHT if key[0] == 'post' else (
+                        COMMENT_WEIGHT)
+                    found[self.documents[key][0]] += count * weight
+                idf = math.log(1 + total / (len(found) or 1))
+                if scores is None:
+                    scores = {
+                        post_id: tf * idf for post_id, tf in found.items()}
+                else:
+                    scores = {
+                        post_id: scores[post_id] + tf * idf
+                        for post_id, tf in found.items() if post_id in scores
+                    }
+                if not scores:
+                    return {}
+            return scores or {}
+
+
+index = InvertedIndex()
+
+
+def uses_fallback():
+    return connection.vendor != 'postgresql'
+
+
+def search(query, queryset=None):
+    """Посты, подходящие под запрос, с аннотацией rank."""
+    if queryset is None:
+        queryset = Post.objects.all()
+    query = (query or '').strip()
+    if not terms(query):
+        return _nothing(queryset)
+    if uses_fallback():
+        return _fallback_search(query, queryset)
+    return _postgres_search(query, queryset)
+
+
+def _nothing(queryset):
+    # Пустая выдача тоже с rank, чтобы ее можно было сортировать.
+    return queryset.annotate(
+        rank=Value(0.0, output_field=FloatField())).none()
+
+
+def _postgres_search(query, queryset):
+    from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                                SearchVector)
+
+    search_query = SearchQuery(query, config=SEARCH_CONFIG)
+    # Выражение совпадает с выражением GIN-индексов из миграции 0028.
+    vector = SearchVector('text', config=SEARCH_CONFIG)
+    # Совпадения в постах и в комментариях — два подзапроса, у каждого
+    # свой GIN-индекс. Набор совпадений остается в базе: выдача читается
+    # постранично по ключу.
+    by_posts = Post.objects.annotate(document=vector).filter(
+        document=search_query).order_by().values('pk')
+    by_comments = Comment.objects.annotate(document=vector).filter(
+        document=search_query).order_by().values('post_id')
+    # Как и в запасном индексе, совпадения в комментариях входят в вес
+    # поста с коэффициентом COMMENT_WEIGHT.
+    comment_rank = Comment.objects.filter(
+        post=OuterRef('pk')
+    ).annotate(document=vector).filter(
+        document=search_query
+    ).order_by().values('post').annotate(
+        total=Sum(SearchRank(vector, search_query))
+    ).values('total')
+    # ts_rank возвращает real; приведение к double precision нужно, чтобы
+    # значение из курсора точно совпадало со значением в базе.
+    rank = (
+        SearchRank(vector, search_query) * Value(POST_WEIGHT)
+        + Coalesce(Subquery(comment_rank), Value(0.0))
+        * Value(COMMENT_WEIGHT)
+    )
+    return queryset.filter(
+        Q(pk__in=by_posts) | Q(pk__in=by_comments)
+    ).annotate(rank=Cast(rank, FloatField()))
+
+
+def _fallback_search(query, queryset):
+    index.build()
+    query_terms = terms(query)
+    candidates = index.score(query_terms)
+    if candidates:
+        index.refresh(list(candidates))
+        candidates = index.score(query_terms)
+    if not candidates:
+        return _nothing(queryset)
+    rank = Case(
+        *(When(pk=post_id, then=Value(round(score, 6)))
+          for post_id, score in candidates.items()),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    return queryset.filter(pk__in=list(candidates)).annotate(rank=rank)
@@ -0,0 +1,174 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import counters, feed_cache, follows, search, timeline
+from .models import Comment, Follow, Group, Post, UserCounter
+
+User = get_user_model()
+
+# Поля пользователя, из которых складывается имя автора в шаблонах.
+AUTHOR_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=User)
+def create_user_counters(sender, instance, created, raw=False, **kwargs):
+    """Заводит счетчики новому пользователю."""
+    if created and not raw:
+        UserCounter.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    """Раскладывает новый пост по лентам подписчиков."""
+    if created and not raw:
+        timeline.fan_out(instance)
+        counters.change_user(instance.author_id, 'posts_count', 1)
+        feed_cache.count_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_post(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_post(instance.post_id, -1)
+
+
+def bump_follow_profiles(follow):
+    """Счетчики подписок видны в профилях обоих пользователей."""
+    feed_cache.bump(
+        feed_cache.profile_feed(follow.author_id),
+        feed_cache.profile_feed(follow.user_id),
+    )
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    """Заполняет ленту постами автора при подписке."""
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+        counters.change_user(instance.author_id, 'followers_count', 1)
+        counters.change_user(instance.user_id, 'following_count', 1)
+        timeline.reconcile(instance.author_id)
+        bump_follow_profiles(instance)
+        follows.forget(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_timeline(sender, instance, **kwargs):
+    """Чистит ленту от постов автора при отписке."""
+    timeline.remove(instance.user_id, instance.author_id)
+    counters.change_user(instance.author_id, 'followers_count', -1)
+    counters.change_user(instance.user_id, 'following_count', -1)
+    timeline.reconcile(instance.author_id)
+    bump_follow_profiles(instance)
+    follows.forget(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, raw=False, **kwargs):
+    """Запоминает прежнюю группу поста, чтобы сбросить и ее ленту."""
+    instance._previous_group_id = None
+    if instance.pk is not None and not raw:
+        instance._previous_group_id = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    feeds = feed_cache.post_feeds(instance)
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id is not None:
+        feeds.append(feed_cache.group_feed(previous_group_id))
+    feed_cache.bump(*feeds)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_feeds(sender, instance, **kwargs):
+    if instance.post_id is not None:
+        feed_cache.bump(feed_cache.post_feed(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, **kwargs):
+    """Название группы есть в карточках главной ленты и профилей."""
+    authors = Post.objects.filter(group=instance).order_by().values_list(
+        'author_id', flat=True).distinct()
+    feed_cache.bump(
+        feed_cache.index_feed(),
+        feed_cache.group_feed(instance.pk),
+        *(feed_cache.profile_feed(author_id) for author_id in authors)
+    )
+
+
+@receiver(pre_save, sender=User)
+def remember_user_names(sender, instance, raw=False, update_fields=None,
+                        **kwargs):
+    """Запоминает, сменилось ли имя пользователя, показанное в лентах."""
+    instance._names_changed = False
+    if (raw or instance.pk is None
+            or update_fields is not None
+            and not set(update_fields) & set(AUTHOR_NAME_FIELDS)):
+        # Вход обновляет только last_login, лишний запрос не нужен.
+        return
+    previous = User.objects.filter(pk=instance.pk).values_list(
+        *AUTHOR_NAME_FIELDS).first()
+    current = tuple(getattr(instance, name) for name in AUTHOR_NAME_FIELDS)
+    instance._names_changed = previous is not None and previous != current
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_feeds(sender, instance, created, raw=False, **kwargs):
+    """Имя автора есть в карточках его постов и в его комментариях."""
+    if created or raw or not getattr(instance, '_names_changed', False):
+        return
+    groups = Post.objects.filter(
+        author=instance, group__isnull=False).order_by().values_list(
+        'group_id', flat=True).distinct()
+    commented = Comment.objects.filter(author=instance).order_by(
+        'post_id').values_list('post_id', flat=True).distinct()
+    feed_cache.bump(
+        feed_cache.index_feed(),
+        feed_cache.profile_feed(instance.pk),
+        *(feed_cache.group_feed(group_id) for group_id in groups),
+        *(feed_cache.post_feed(post_id) for post_id in commented)
+    )
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    """Обновляет запасной поисковый индекс (в PostgreSQL его ведет база)."""
+    if not raw and search.uses_fallback():
+        search.index.add('post', instance.pk, instance.pk, instance.text)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    if search.uses_fallback():
+        search.index.discard('post', instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, raw=False, **kwargs):
+    if not raw and search.uses_fallback():
+        search.index.add(
+            'comment', instance.pk, instance.post_id, instance.text)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    if search.uses_fallback():
+        search.index.discard('comment', instance.pk)
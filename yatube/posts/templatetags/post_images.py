@@ -0,0 +1,26 @@
+from django import template
+
+from posts import resize, thumbnails
+
+register = template.Library()
+
+
+@register.inclusion_tag('includes/post_image.html')
+def post_image(image, eager=False):
+    """Миниатюра картинки поста в ленте с srcset и ленивой загрузкой.
+
+    Картинку первой карточки (eager) браузер грузит сразу, остальные —
+    по мере прокрутки.
+    """
+    return {
+        'im': thumbnails.responsive(image) if image else None,
+        'eager': eager,
+    }
+
+
+@register.simple_tag
+def resized_image_url(image, width, crop=resize.FIT, fmt=resize.AUTO):
+    """Подписанный адрес картинки поста нужной ширины."""
+    if not image:
+        return ''
+    return resize.url(image.name, width, crop, fmt)
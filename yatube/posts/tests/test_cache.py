@@ -1,9 +1,12 @@
+from unittest import mock
+
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase
 from django.urls import reverse
 from django.core.cache import cache
 
-from posts.models import Post
+from posts import cards
+from posts.models import Group, Post
 
 User = get_user_model()
 
@@ -16,19 +19,137 @@ class CacheTests(TestCase):
         cls.user = User.objects.create_user(username='Mikhail')
         cls.authorized_client = Client()
         cls.authorized_client.force_login(cls.user)
+        cls.group = Group.objects.create(
+            title='Какой-нибудь заголовок',
+            description='Какое-нибудь описание',
+            slug='slug',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Закэшированный текст',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def feed_urls(self):
+        return [
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        ]
 
     def test_cache(self):
-        response = CacheTests.authorized_client.get(reverse('posts:index'))
-        data = response.content
+        """Ленты отдаются из кэша, пока в них ничего не менялось."""
+        for url in self.feed_urls():
+            with self.subTest(url=url):
+                data = CacheTests.authorized_client.get(url).content
+                Post.objects.filter(pk=self.post.pk).update(text='Без сигнала')
+                new_data = CacheTests.authorized_client.get(url).content
+                self.assertEqual(data, new_data)
+                cache.clear()
+                data_after_cleansing = CacheTests.authorized_client.get(
+                    url).content
+                self.assertNotEqual(new_data, data_after_cleansing)
+                Post.objects.filter(pk=self.post.pk).update(
+                    text='Закэшированный текст')
+
+    def test_new_post_invalidates_feeds(self):
+        """Новый пост сразу появляется во всех своих лентах."""
+        for url in self.feed_urls():
+            CacheTests.authorized_client.get(url)
         Post.objects.create(
             author=self.user,
-            text='Какой-либо текст',
+            text='Только что опубликовано',
+            group=self.group,
+        )
+        for url in self.feed_urls():
+            with self.subTest(url=url):
+                response = CacheTests.authorized_client.get(url)
+                self.assertContains(response, 'Только что опубликовано')
+
+    def test_other_feeds_stay_cached(self):
+        """Пост другого автора без группы не сбрасывает ленту группы
+        и чужой профиль."""
+        other = User.objects.create_user(username='Other')
+        urls = self.feed_urls()[1:]
+        before = [
+            CacheTests.authorized_client.get(url).content for url in urls]
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигнала')
+        Post.objects.create(author=other, text='Пост без группы')
+        after = [
+            CacheTests.authorized_client.get(url).content for url in urls]
+        self.assertEqual(before, after)
+
+    def test_author_name_change_invalidates_feeds(self):
+        """Новое имя автора сразу видно во всех лентах, а вход
+        пользователя ленты не сбрасывает."""
+        for url in self.feed_urls():
+            CacheTests.guest_client.get(url)
+        self.user.last_login = self.post.pub_date
+        with mock.patch('posts.feed_cache.bump') as bump:
+            self.user.save(update_fields=['last_login'])
+            self.user.save()
+        bump.assert_not_called()
+        self.user.first_name = 'Михаил'
+        self.user.last_name = 'Лермонтов'
+        self.user.save()
+        for url in self.feed_urls():
+            with self.subTest(url=url):
+                response = CacheTests.guest_client.get(url)
+                self.assertContains(response, 'Михаил Лермонтов')
+        self.user.first_name = self.user.last_name = ''
+        self.user.save()
+
+
+class CardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='Mikhail', first_name='Михаил')
+        cls.client_user = Client()
+        cls.client_user.force_login(cls.user)
+        cls.group = Group.objects.create(
+            title='Заголовок', description='Описание', slug='slug')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {number}', group=cls.group)
+            for number in range(3)
         )
-        new_response = CacheTests.authorized_client.get(reverse('posts:index'))
-        new_data = new_response.content
-        self.assertEqual(data, new_data)
+
+    def setUp(self):
         cache.clear()
-        response_after_cleansing = CacheTests.authorized_client.get(reverse(
-            'posts:index'))
-        data_after_cleansing = response_after_cleansing.content
-        self.assertNotEqual(new_data, data_after_cleansing)
+
+    def test_card_is_rendered_once_for_all_feeds(self):
+        """Карточка поста отрисовывается один раз и общая для всех лент."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:search') + '?q=Пост',
+        ]
+        with mock.patch.object(
+                cards, 'render_to_string',
+                wraps=cards.render_to_string) as render, \
+                mock.patch.object(
+                    cards.cache, 'get_many',
+                    wraps=cards.cache.get_many) as get_many:
+            for url in urls:
+                with self.subTest(url=url):
+                    response = self.client_user.get(url)
+                    self.assertContains(response, 'Пост 1')
+                    self.assertContains(response, 'Михаил')
+        self.assertEqual(render.call_count, 3)
+        card_reads = [
+            call for call in get_many.call_args_list
+            if all(key.startswith('post-card:') for key in call[0][0])
+        ]
+        self.assertEqual(len(card_reads), len(urls))
+
+    def test_card_changes_with_its_content(self):
+        """Новое имя автора попадает в карточку без сброса кэша."""
+        url = reverse('posts:search') + '?q=Пост'
+        self.client_user.get(url)
+        User.objects.filter(pk=self.user.pk).update(first_name='Миша')
+        self.assertContains(self.client_user.get(url), 'Миша', count=3)
@@ -0,0 +1,99 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+        self.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ]
+
+    def revalidate(self, client, url):
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_are_not_rendered(self):
+        """Неизменная страница отвечает 304 без отрисовки шаблона."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.revalidate(self.guest, url)
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse(response.templates)
+
+    def test_guest_last_modified(self):
+        """Гостю отдается Last-Modified, и If-Modified-Since дает 304."""
+        url = self.urls[0]
+        response = self.guest.get(url)
+        response = self.guest.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_invalidate_validator(self):
+        """Новый пост, комментарий и подписка меняют валидатор."""
+        changes = {
+            self.urls[0]: lambda: Post.objects.create(
+                author=self.author, text='Новый пост'),
+            self.urls[1]: lambda: self.group.save(),
+            self.urls[2]: lambda: Follow.objects.create(
+                user=self.reader, author=self.author),
+            self.urls[3]: lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'),
+        }
+        for url, change in changes.items():
+            with self.subTest(url=url):
+                etag = self.guest.get(url)['ETag']
+                change()
+                response = self.guest.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_validator_depends_on_user(self):
+        """Разметка для пользователя не совпадает с гостевой по ETag."""
+        client = Client()
+        client.force_login(self.reader)
+        url = self.urls[3]
+        guest_etag = self.guest.get(url)['ETag']
+        response = client.get(url, HTTP_IF_NONE_MATCH=guest_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.revalidate(client, url).status_code, 304)
+
+    def test_missing_objects_are_not_found(self):
+        """Для несуществующих объектов ответ по-прежнему 404."""
+        response = self.guest.get(
+            reverse('posts:profile', kwargs={'username': 'nobody'}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_guest_pages_are_public(self):
+        """Гостевые страницы можно держать в общем кэше, личные нельзя."""
+        client = Client()
+        client.force_login(self.reader)
+        for url in self.urls:
+            with self.subTest(url=url):
+                cache_control = self.guest.get(url)['Cache-Control']
+                self.assertIn('public', cache_control)
+                self.assertIn('s-maxage', cache_control)
+                response = client.get(url)
+                self.assertNotIn(
+                    'public', response.get('Cache-Control', ''))
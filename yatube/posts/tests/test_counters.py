@@ -0,0 +1,173 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import view_counts
+from posts.forms import PostForm
+from posts.models import Comment, Follow, Post, UserCounter
+
+User = get_user_model()
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+
+    def counters(self, user):
+        return UserCounter.objects.get(user=user)
+
+    def test_counters_follow_changes(self):
+        """Счетчики меняются при создании и удалении записей."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.counters(self.author).followers_count, 0)
+        self.assertEqual(self.counters(self.reader).following_count, 0)
+        post.delete()
+        self.assertEqual(self.counters(self.author).posts_count, 0)
+
+    def test_counters_do_not_go_below_zero(self):
+        """Отставший счетчик не уходит в минус при удалении."""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        UserCounter.objects.update(followers_count=0, following_count=0)
+        Post.objects.update(comments_count=0)
+        follow.delete()
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.counters(self.author).followers_count, 0)
+
+    def test_edit_keeps_concurrent_counter_changes(self):
+        """Правка поста не затирает счетчики, изменившиеся во время нее."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        client = Client()
+        client.force_login(self.author)
+        is_valid = PostForm.is_valid
+
+        def concurrent_update(form):
+            # Комментарий и просмотры приходят, пока правка в процессе.
+            Post.objects.filter(pk=post.pk).update(
+                comments_count=5, views_count=7)
+            return is_valid(form)
+
+        with mock.patch.object(PostForm, 'is_valid', concurrent_update):
+            client.post(
+                reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+                {'text': 'Новый текст'})
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Новый текст')
+        self.assertEqual((post.comments_count, post.views_count), (5, 7))
+
+    def test_rebuild_counters_fixes_drift(self):
+        """Команда rebuild_counters сверяет счетчики с таблицами."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Да')
+        UserCounter.objects.filter(user=self.author).update(posts_count=7)
+        Post.objects.filter(pk=post.pk).update(comments_count=0)
+        UserCounter.objects.filter(user=self.reader).delete()
+        out = StringIO()
+        call_command('rebuild_counters', stdout=out)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.assertEqual(self.counters(self.reader).posts_count, 0)
+        self.assertIn('posts_count: исправлено строк 1', out.getvalue())
+
+    def test_pages_do_not_count_rows(self):
+        """Профиль и страница поста не выполняют COUNT(*)."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        client = Client()
+        client.force_login(self.reader)
+        urls = [
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail', kwargs={'post_id': post.id}),
+        ]
+        for url in urls:
+            cache.clear()
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+                self.assertContains(response, 'Всего постов')
+                for query in queries.captured_queries:
+                    self.assertNotIn('COUNT(', query['sql'].upper())
+
+
+class ViewCountTests(TestCase):
+    """Просмотры копятся в памяти и пишутся в базу одним запросом."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.first = Post.objects.create(author=cls.author, text='Первый')
+        cls.second = Post.objects.create(author=cls.author, text='Второй')
+
+    def setUp(self):
+        cache.clear()
+        view_counts.reset()
+
+    def views(self, post):
+        return Post.objects.get(pk=post.pk).views_count
+
+    def test_flush_updates_cached_page(self):
+        """После записи просмотров страница поста и ее ETag обновляются."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.first.pk})
+        response = Client().get(url)
+        self.assertEqual(response.context['views_count'], 0)
+        view_counts.flush()
+        response = Client().get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['views_count'], 1)
+
+    def test_views_are_flushed_in_one_query(self):
+        """Просмотры из кэша страниц тоже учитываются."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.first.pk})
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(3):
+                response = Client().get(url)
+        self.assertFalse(any(
+            'views_count' in query['sql'] and 'UPDATE' in query['sql']
+            for query in queries.captured_queries))
+        self.assertContains(response, 'Просмотров:')
+        self.assertEqual(view_counts.count(self.first), 3)
+        view_counts.record(self.second.pk)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(view_counts.flush(), 2)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(self.views(self.first), 3)
+        self.assertEqual(self.views(self.second), 1)
+        self.assertEqual(view_counts.pending(self.first.pk), 0)
+
+    def test_failed_flush_keeps_views(self):
+        """Если запись не удалась, просмотры уходят со следующей."""
+        view_counts.record(self.first.pk)
+        with mock.patch.object(
+                view_counts, '_write', side_effect=OperationalError):
+            self.assertEqual(view_counts.flush(), 0)
+        view_counts.record(self.first.pk)
+        self.assertEqual(view_counts.pending(self.first.pk), 2)
+        view_counts.flush()
+        self.assertEqual(self.views(self.first), 2)
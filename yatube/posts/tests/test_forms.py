@@ -1,18 +1,19 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
-from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
 
 from posts.models import Post
 from posts.models import Comment
 
 User = get_user_model()
 
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -109,3 +110,76 @@ class PostCreateFormTests(TestCase):
         self.assertEqual(last_object.author, self.user)
         self.assertEqual(last_object.post, post)
         self.assertEqual(one_comment, zero_comments + 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_MAX_SIDE=400)
+class ImageUploadTests(TestCase):
+    """Картинки при загрузке уменьшаются и пересохраняются."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, name, image, **save_options):
+        content = BytesIO()
+        image.save(content, **save_options)
+        self.authorized_client.post(reverse('posts:create'), {
+            'text': name,
+            'image': SimpleUploadedFile(name, content.getvalue()),
+        })
+        post = Post.objects.get(text=name)
+        return post.image.name, Image.open(post.image.path)
+
+    def test_large_photo_is_resized_without_exif(self):
+        """Большой снимок уменьшается, поворачивается и теряет EXIF."""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Ориентация: повернуть на 90 градусов.
+        exif[0x010F] = 'Camera'
+        name, image = self.upload(
+            'camera.jpg', Image.new('RGB', (1200, 800), (0, 128, 255)),
+            format='JPEG', exif=exif.tobytes())
+        self.assertEqual(name, 'posts/camera.jpg')
+        self.assertEqual(image.size, (267, 400))
+        self.assertNotIn('exif', image.info)
+        self.assertTrue(image.info.get('progressive'))
+
+    def test_png_becomes_jpeg(self):
+        """Прозрачный PNG пересохраняется в JPEG на белом фоне."""
+        name, image = self.upload(
+            'logo.png', Image.new('RGBA', (100, 50), (255, 0, 0, 0)),
+            format='PNG')
+        self.assertEqual(name, 'posts/logo.jpg')
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.size, (100, 50))
+        self.assertGreater(min(image.getpixel((50, 25))), 240)
+
+    def test_truncated_photo_is_rejected(self):
+        """Обрезанный JPEG дает ошибку формы, а не ошибку сервера."""
+        content = BytesIO()
+        Image.effect_noise((600, 400), 64).convert('RGB').save(
+            content, format='JPEG')
+        data = content.getvalue()
+        response = self.authorized_client.post(reverse('posts:create'), {
+            'text': 'Обрезанный снимок',
+            'image': SimpleUploadedFile('broken.jpg', data[:len(data) // 2]),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].has_error('image'))
+        self.assertFalse(
+            Post.objects.filter(text='Обрезанный снимок').exists())
+
+    def test_animated_gif_is_kept(self):
+        frames = [Image.new('P', (500, 500), color) for color in (1, 2)]
+        name, image = self.upload(
+            'cat.gif', frames[0], format='GIF', save_all=True,
+            append_images=frames[1:])
+        self.assertEqual(name, 'posts/cat.gif')
+        self.assertTrue(image.is_animated)
+        self.assertEqual(image.size, (500, 500))
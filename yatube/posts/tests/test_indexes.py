@@ -0,0 +1,52 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост')
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def test_feeds_use_composite_indexes(self):
+        """Ленты профиля и группы читаются по составным индексам."""
+        feeds = {
+            'post_author_pub_date_idx': Post.objects.filter(
+                author=self.author),
+            'post_group_pub_date_idx': Post.objects.filter(group=self.group),
+        }
+        for index, queryset in feeds.items():
+            with self.subTest(index=index):
+                plan = queryset.order_by('-pub_date', '-id')[:10].explain()
+                self.assertIn(index, plan)
+
+    def test_benchmark_keeps_indexes(self):
+        """Замер без индексов откатывается и индексы остаются."""
+        out = StringIO()
+        call_command('benchmark_indexes', repeat=1, stdout=out)
+        self.assertIn('Лента профиля', out.getvalue())
+        self.assertIn('без индексов', out.getvalue())
+        with connection.cursor() as cursor:
+            names = {
+                name
+                for table in ('posts_post', 'posts_comment', 'posts_follow')
+                for name in connection.introspection.get_constraints(
+                    cursor, table)
+            }
+        self.assertIn('post_author_pub_date_idx', names)
+        self.assertIn('follow_user_author_idx', names)
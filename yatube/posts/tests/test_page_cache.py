@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+
+    def test_guest_hit_skips_stack(self):
+        """Повторная страница для гостя отдается без запросов и шаблонов."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        first = self.guest.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.guest.get(url)
+        self.assertEqual(len(queries), 0)
+        self.assertFalse(second.templates)
+        self.assertEqual(second.content, first.content)
+        not_modified = self.guest.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_changes_invalidate_page(self):
+        """Новый пост и комментарий сразу видны гостю."""
+        index = reverse('posts:index')
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.guest.get(index)
+        self.guest.get(detail)
+        Post.objects.create(author=self.author, text='Свежий пост')
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Свежий комментарий')
+        self.assertContains(self.guest.get(index), 'Свежий пост')
+        self.assertContains(self.guest.get(detail), 'Свежий комментарий')
+
+    def test_signed_in_users_are_not_cached(self):
+        """Запросы с cookie сессии всегда проходят весь стек."""
+        client = Client()
+        client.force_login(self.author)
+        url = reverse('posts:index')
+        client.get(url)
+        response = client.get(url)
+        self.assertTrue(response.templates)
+        self.assertContains(response, 'author')
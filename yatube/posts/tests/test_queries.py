@@ -0,0 +1,169 @@
+from importlib import import_module
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth import BACKEND_SESSION_KEY, get_user_model
+from django.contrib.auth.models import Group as UserGroup
+from django.contrib.sessions.backends.cached_db import SessionStore
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from users.backends import USER_KEY
+
+User = get_user_model()
+
+
+class QueryCountTests(TestCase):
+    """Число запросов страницы не зависит от числа постов на ней."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(
+            username='author', first_name='Михаил', last_name='Соколов')
+        cls.client_reader = Client()
+        cls.client_reader.force_login(cls.reader)
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Первый пост',
+            group=cls.group,
+        )
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Да')
+
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_reader.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def add_rows(self):
+        for number in range(9):
+            commenter = User.objects.create_user(username=f'user_{number}')
+            Post.objects.create(
+                author=self.author,
+                text=f'Пост {number}',
+                group=self.group,
+            )
+            Comment.objects.create(
+                post=self.post, author=commenter, text=f'Комментарий {number}')
+
+    def test_pages_have_fixed_number_of_queries(self):
+        """Ленты и страница поста не делают запросов на каждую строку."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ]
+        before = {url: self.count_queries(url) for url in urls}
+        self.add_rows()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), before[url])
+
+
+class CachedAuthTests(TestCase):
+    """Сессия, пользователь и подписка повторно берутся из кэша."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            username='reader', password='old-password')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        cache.clear()
+        self.client_reader = Client()
+        self.client_reader.force_login(self.reader)
+        self.url = reverse('posts:profile', args=[self.author.username])
+
+    def tables(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_reader.get(url)
+        self.assertEqual(response.status_code, 200)
+        return ' '.join(query['sql'] for query in queries)
+
+    def test_second_request_skips_session_user_and_follow(self):
+        """Повторный запрос не читает сессию, пользователя и подписку."""
+        self.tables(self.url)
+        sql = self.tables(self.url)
+        self.assertNotIn('django_session', sql)
+        self.assertNotIn('FROM "auth_user" WHERE "auth_user"."id"', sql)
+        self.assertNotIn('posts_follow', sql)
+
+    def test_follow_resets_cached_check(self):
+        """После подписки профиль показывает кнопку отписки."""
+        response = self.client_reader.get(self.url)
+        self.assertFalse(response.context['following'])
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client_reader.get(self.url)
+        self.assertTrue(response.context['following'])
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        response = self.client_reader.get(self.url)
+        self.assertFalse(response.context['following'])
+
+    def test_password_change_ends_cached_session(self):
+        """Смена пароля сбрасывает пользователя из кэша и сессию."""
+        self.client_reader.get(self.url)
+        self.reader.set_password('new-password')
+        self.reader.save()
+        response = self.client_reader.get(reverse('posts:follow_index'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_group_change_resets_cached_user(self):
+        """Смена групп пользователя с любой стороны сбрасывает его из кэша."""
+        key = USER_KEY.format(self.reader.pk)
+        editors = UserGroup.objects.create(name='editors')
+        changes = (
+            lambda: self.reader.groups.add(editors),
+            lambda: editors.user_set.remove(self.reader),
+            lambda: editors.user_set.add(self.reader),
+            lambda: editors.user_set.clear(),
+        )
+        for change in changes:
+            self.client_reader.get(self.url)
+            self.assertIsNotNone(cache.get(key))
+            change()
+            self.assertIsNone(cache.get(key))
+
+    def test_failed_login_checks_password_once(self):
+        """Неверный пароль проверяется одним бэкендом, а не каждым."""
+        with mock.patch.object(
+                User, 'check_password', return_value=False) as check:
+            self.assertFalse(
+                Client().login(username='reader', password='wrong'))
+        self.assertEqual(check.call_count, 1)
+
+    def test_model_backend_session_survives_migration(self):
+        """Сессия, открытая через ModelBackend, после миграции живет."""
+        migration = import_module('users.migrations.0001_session_auth_backend')
+        session = SessionStore()
+        session.update({
+            '_auth_user_id': str(self.reader.pk),
+            BACKEND_SESSION_KEY: migration.MODEL_BACKEND,
+            '_auth_user_hash': self.reader.get_session_auth_hash(),
+        })
+        session.create()
+        client = Client()
+        client.cookies['sessionid'] = session.session_key
+        url = reverse('posts:follow_index')
+        self.assertEqual(client.get(url).status_code, 302)
+        migration.forwards(apps, None)
+        self.assertEqual(client.get(url).status_code, 200)
+        self.assertEqual(
+            SessionStore(session.session_key)[BACKEND_SESSION_KEY],
+            migration.CACHED_BACKEND)
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import BytesIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import Client, SimpleTestCase, override_settings
+from PIL import Image
+
+from posts import resize
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+TEMP_CACHE_DIR = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, RESIZE_CACHE_DIR=TEMP_CACHE_DIR)
+class ImageResizeTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        content = BytesIO()
+        Image.new('RGB', (1200, 800), (0, 128, 0)).save(content, 'JPEG')
+        cls.name = default_storage.save(
+            'posts/photo.jpg', ContentFile(content.getvalue()))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+        self.client = Client()
+
+    def get(self, url, **headers):
+        response = self.client.get(url, **headers)
+        content = b''.join(response.streaming_content)
+        return response, Image.open(BytesIO(content))
+
+    def test_resized_variant(self):
+        """Адрес отдает картинку нужной ширины и кадрирования."""
+        response, image = self.get(resize.url(self.name, 480, '960x339'))
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(image.size, (480, 170))
+        self.assertIn('max-age', response['Cache-Control'])
+        response, image = self.get(resize.url(self.name, 300))
+        self.assertEqual(image.size, (300, 200))
+
+    def test_source_is_not_upscaled(self):
+        response, image = self.get(resize.url(self.name, 2000))
+        self.assertEqual(image.size, (1200, 800))
+
+    def test_webp_by_accept(self):
+        """Формат auto выбирается по заголовку Accept."""
+        url = resize.url(self.name, 320)
+        response, image = self.get(
+            url, HTTP_ACCEPT='image/avif,image/webp,*/*')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(image.format, 'WEBP')
+        self.assertIn('Accept', response['Vary'])
+        response, image = self.get(url, HTTP_ACCEPT='image/*')
+        self.assertEqual(image.format, 'JPEG')
+
+    def test_signature_is_required(self):
+        """Адрес с чужой подписью или размером не обслуживается."""
+        url = resize.url(self.name, 320)
+        self.assertEqual(
+            self.client.get(url.replace('/320/', '/321/')).status_code, 404)
+        signature = resize.sign(self.name, 320)
+        self.assertEqual(
+            self.client.get(url.replace(signature, 'x' * len(signature)))
+            .status_code, 404)
+        self.assertEqual(
+            self.client.get(resize.url('posts/missing.jpg', 320))
+            .status_code, 404)
+
+    def test_broken_source_is_not_found(self):
+        """Обрезанный или нераспознанный исходник дает 404, а не 500."""
+        content = BytesIO()
+        Image.effect_noise((600, 400), 64).convert('RGB').save(
+            content, 'JPEG')
+        sources = {
+            'posts/broken.jpg': content.getvalue()[:2000],
+            'posts/text.jpg': b'not an image',
+        }
+        for name, data in sources.items():
+            with self.subTest(name=name):
+                name = default_storage.save(name, ContentFile(data))
+                response = self.client.get(resize.url(name, 320))
+                self.assertEqual(response.status_code, 404)
+
+    def test_foreign_lock_is_kept(self):
+        """Не дождавшись чужого варианта, процесс создает его сам, но
+        чужую блокировку не снимает."""
+        key = hashlib.sha256(
+            resize._value(self.name, 200, resize.FIT, 'jpeg').encode()
+        ).hexdigest()
+        lock_key = resize.LOCK_KEY.format(key)
+        cache.set(lock_key, 'другой процесс', resize.LOCK_TIMEOUT)
+        with mock.patch.object(
+                resize, '_wait_for_other_process', return_value=False):
+            resize.open_variant(self.name, 200, resize.FIT, 'jpeg').close()
+        self.assertEqual(cache.get(lock_key), 'другой процесс')
+
+    def test_concurrent_requests_resize_once(self):
+        """Сто одновременных запросов варианта уменьшают картинку раз."""
+        calls = []
+        original = resize.render
+
+        def slow_render(*args):
+            calls.append(args)
+            time.sleep(0.1)
+            original(*args)
+
+        files = []
+        with mock.patch.object(resize, 'render', slow_render):
+            threads = [
+                threading.Thread(target=lambda: files.append(
+                    resize.open_variant(self.name, 200, resize.FIT, 'jpeg')))
+                for _ in range(100)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        for file in files:
+            file.close()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(files), 100)
+
+
+class DiskCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.disk_cache = resize.DiskCache(self.directory, max_bytes=250)
+
+    def store(self, key, mtime):
+        path = self.disk_cache.path(key, 'jpg')
+        self.disk_cache.store(path, lambda output: output.write(b'x' * 100))
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_least_recently_used_files_are_evicted(self):
+        first = self.store('aa1', 1)
+        second = self.store('aa2', 2)
+        # Обращение к первому файлу делает его самым свежим.
+        self.disk_cache.open(first).close()
+        third = self.store('bb3', time.time() + 10)
+        self.assertTrue(os.path.exists(first))
+        self.assertFalse(os.path.exists(second))
+        self.assertTrue(os.path.exists(third))
+        self.assertLessEqual(self.disk_cache.scan()[1], 250)
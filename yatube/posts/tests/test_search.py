@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+
+    def setUp(self):
+        self.client = Client()
+
+    def found(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return [post.text for post in response.context['page_obj']]
+
+    def test_stemming_and_ranking(self):
+        """Поиск находит другие формы слова и ставит выше частые."""
+        Post.objects.create(author=self.author, text='Один кот')
+        Post.objects.create(author=self.author, text='Коты и котами')
+        Post.objects.create(author=self.author, text='Про собак')
+        self.assertEqual(self.found('котов'), ['Коты и котами', 'Один кот'])
+        self.assertEqual(self.found(''), [])
+
+    def test_comments_and_edits(self):
+        """Находятся посты по комментариям, правки видны сразу."""
+        post = Post.objects.create(author=self.author, text='Прогулка')
+        Comment.objects.create(
+            post=post, author=self.author, text='Отличная погода')
+        self.assertEqual(self.found('погоды'), ['Прогулка'])
+        post.text = 'Рыбалка'
+        post.save()
+        self.assertEqual(self.found('прогулка'), [])
+        self.assertEqual(self.found('рыбалку'), ['Рыбалка'])
+        post.delete()
+        self.assertEqual(self.found('рыбалка'), [])
+
+    def test_keyset_pagination_keeps_query(self):
+        """Страницы выдачи связаны курсором и сохраняют запрос."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Запись {number}')
+            for number in range(13)
+        )
+        search.index.refresh(
+            list(Post.objects.values_list('pk', flat=True)))
+        response = self.client.get(reverse('posts:search'), {'q': 'запись'})
+        first = list(response.context['page_obj'])
+        self.assertEqual(len(first), 10)
+        self.assertContains(response, '?q=%D0%B7%D0%B0%D0%BF%D0%B8%D1%81%D1'
+                                      '%8C&amp;cursor=')
+        cursor = response.context['page_obj'].paginator.next_cursor
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'запись', 'cursor': cursor})
+        second = list(response.context['page_obj'])
+        self.assertEqual(len(second), 3)
+        self.assertFalse({post.pk for post in first}
+                         & {post.pk for post in second})
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идет по тому же индексу."""
+        Post.objects.create(author=self.author, text='Весенний лес')
+        Post.objects.create(author=self.author, text='Зимнее поле')
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'лесом'})
+        self.assertEqual(
+            [post.text for post in response.context['cl'].result_list],
+            ['Весенний лес'],
+        )
+
+    def test_postgres_matches_stay_in_database(self):
+        """Запрос для PostgreSQL собирается без выборки совпадений."""
+        with self.assertNumQueries(0):
+            found = search._postgres_search('пост', Post.objects.all())
+        self.assertEqual(str(found.query).count(' IN (SELECT '), 2)
@@ -0,0 +1,69 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts import counters
+from posts.models import Comment, Follow, Post, TimelineEntry
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+SEED_OPTIONS = {
+    'users': 30,
+    'groups': 4,
+    'posts': 120,
+    'comments': 200,
+    'follows': 5,
+    'images': 0.2,
+    'batch_size': 50,
+}
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedDatasetTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def seed(self):
+        call_command('seed_dataset', stdout=StringIO(), **SEED_OPTIONS)
+
+    def test_dataset_is_reproducible_and_consistent(self):
+        """Набор данных повторяется при том же seed и согласован."""
+        self.seed()
+        texts = list(Post.objects.order_by('pk').values_list(
+            'text', 'image'))
+        self.assertEqual(Post.objects.count(), 120)
+        self.assertEqual(Comment.objects.count(), 200)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertEqual(
+            TimelineEntry.objects.count(),
+            sum(Post.objects.filter(author=follow.author).count()
+                for follow in Follow.objects.select_related('author')),
+        )
+        self.assertFalse(any(counters.rebuild().values()))
+        call_command('seed_dataset', clear=True, stdout=StringIO())
+        self.assertFalse(Post.objects.exists())
+        self.seed()
+        self.assertEqual(
+            list(Post.objects.order_by('pk').values_list(
+                'text', 'image')),
+            texts,
+        )
+
+    @override_settings(NEW_POSTS_ENABLED=True)
+    def test_benchmark_views_covers_all_routes(self):
+        """Замер проходит по всем адресам posts и не меняет данные."""
+        self.seed()
+        comments = Comment.objects.count()
+        out = StringIO()
+        call_command('benchmark_views', requests=3, stdout=out)
+        for route in ('index', 'group_posts', 'profile', 'post_detail',
+                      'post_comments', 'search', 'search_cursor',
+                      'new_posts', 'new_posts_follow', 'image_resize',
+                      'create', 'post_edit', 'add_comment',
+                      'follow_index', 'profile_follow', 'profile_unfollow'):
+            self.assertIn(route, out.getvalue())
+        self.assertEqual(Comment.objects.count(), comments)
@@ -0,0 +1,148 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from posts import feed_cache, thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Mikhail')
+        cls.client_user = Client()
+        cls.client_user.force_login(cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        content = BytesIO()
+        Image.new('RGB', (1200, 800), color=(255, 0, 0)).save(
+            content, 'JPEG')
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('photo.jpg', content.getvalue()),
+        )
+
+    def test_generate_all_sizes(self):
+        """Генерация создает миниатюры всех размеров шаблонов."""
+        generated = thumbnails.generate(self.post.image.name)
+        self.assertEqual(set(generated), set(thumbnails.THUMBNAIL_SIZES))
+        self.assertEqual(
+            (generated['feed']['width'], generated['feed']['height']),
+            (960, 339),
+        )
+        self.assertTrue(generated['feed_webp']['url'].endswith('.webp'))
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        """Пока миниатюра не готова, лента показывает заглушку."""
+        url = reverse('posts:index')
+        response = self.client_user.get(url)
+        self.assertContains(response, 'data:image/svg+xml')
+        name = self.post.image.name
+        generated = thumbnails.generate(name)
+        thumbnails.remember([self.post.pk], name, generated)
+        feed_cache.bump(*feed_cache.post_feeds(self.post))
+        response = self.client_user.get(url)
+        self.assertNotContains(response, 'data:image/svg+xml')
+        self.assertContains(response, generated['feed']['url'])
+
+    def test_thumbnails_are_loaded_with_page(self):
+        """Миниатюры всей страницы ленты читаются одним запросом."""
+        name = self.post.image.name
+        generated = thumbnails.generate(name)
+        posts = [self.post] + [
+            Post.objects.create(author=self.user, text=f'Пост {number}',
+                                image=name)
+            for number in range(3)
+        ]
+        thumbnails.remember([post.pk for post in posts], name, generated)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_user.get(reverse('posts:index'))
+        self.assertNotContains(response, 'data:image/svg+xml')
+        thumbnail_queries = [
+            query for query in queries.captured_queries
+            if 'posts_postthumbnail' in query['sql']
+        ]
+        self.assertEqual(len(thumbnail_queries), 1)
+
+    def test_feed_images_are_responsive(self):
+        """Ленты отдают srcset, WebP и ленивую загрузку после первой."""
+        name = self.post.image.name
+        generated = thumbnails.generate(name)
+        second = Post.objects.create(
+            author=self.user, text='Второй пост', image=name)
+        thumbnails.remember([self.post.pk, second.pk], name, generated)
+        cache.clear()
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.user.username]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                content = self.client_user.get(url).content.decode()
+                self.assertIn(
+                    f'{generated["feed_480"]["url"]} 480w, '
+                    f'{generated["feed_720"]["url"]} 720w, '
+                    f'{generated["feed"]["url"]} 960w', content)
+                self.assertIn('type="image/webp"', content)
+                self.assertIn('width="960" height="339"', content)
+                self.assertEqual(content.count('decoding="async"'), 2)
+                self.assertEqual(content.count('loading="lazy"'), 1)
+
+    def test_failed_alias_is_retried_with_backoff(self):
+        """Недоступный размер не перестраивает миниатюры при каждой
+        отрисовке и не сбрасывает кэш лент."""
+        original = thumbnails.get_thumbnail
+
+        def broken_webp(name, geometry, **options):
+            if options.get('format') == 'WEBP':
+                raise OSError('encoder not available')
+            return original(name, geometry, **options)
+
+        feeds = feed_cache.post_feeds(self.post)
+        with mock.patch.object(thumbnails, 'get_thumbnail', broken_webp), \
+                mock.patch.object(thumbnails.logger, 'exception'):
+            thumbnails._generate(self.post.pk, self.post.image.name, feeds)
+            self.assertTrue(thumbnails.failed(self.post.image.name))
+            versions = feed_cache.versions(*feeds)
+            self.client_user.get(reverse('posts:index'))
+            self.assertIsNone(cache.get(
+                thumbnails.PENDING_KEY.format(self.post.image.name)))
+            # Повтор после паузы создает только недостающие размеры и не
+            # трогает ленты, если новых миниатюр не появилось.
+            cache.set(
+                thumbnails.FAILED_KEY.format(self.post.image.name), (1, 0))
+            with mock.patch.object(
+                    thumbnails, 'generate',
+                    wraps=thumbnails.generate) as generate:
+                thumbnails._generate(
+                    self.post.pk, self.post.image.name, feeds)
+        self.assertEqual(
+            generate.call_args[1]['skip'], {'feed', 'feed_720', 'feed_480'})
+        self.assertEqual(feed_cache.versions(*feeds), versions)
+        attempts, _ = cache.get(
+            thumbnails.FAILED_KEY.format(self.post.image.name))
+        self.assertEqual(attempts, 2)
@@ -0,0 +1,107 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import timeline
+from posts.models import Follow, Post, TimelineEntry, UserCounter
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_new_post_goes_to_followers_timeline(self):
+        """Новый пост раскладывается в ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(list(timeline.feed(self.reader)), [post])
+
+    def test_follow_backfills_and_unfollow_clears_timeline(self):
+        """Подписка заполняет ленту, отписка ее очищает."""
+        post = Post.objects.create(author=self.author, text='Старый пост')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(list(timeline.feed(self.reader)), [post])
+        follow.delete()
+        self.assertFalse(timeline.feed(self.reader).exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_author_posts_are_pulled(self):
+        """Посты популярного автора не раскладываются, а читаются
+        при построении ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        cache.clear()
+        post = Post.objects.create(author=self.author, text='Популярный')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertIn(post, timeline.feed(self.reader))
+
+    def test_author_returning_to_fan_out_is_refilled(self):
+        """Посты, опубликованные без раскладки, попадают в ленты, когда
+        автор возвращается к раскладке."""
+        other = User.objects.create_user(username='other')
+        with override_settings(TIMELINE_FANOUT_LIMIT=2):
+            Follow.objects.create(user=self.reader, author=self.author)
+            follow = Follow.objects.create(user=other, author=self.author)
+            self.assertIsNotNone(
+                UserCounter.objects.get(user=self.author).pulled_since)
+            post = Post.objects.create(
+                author=self.author, text='Без раскладки')
+            self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+            # TestCase не фиксирует транзакцию, дозапись выполняется сразу.
+            with mock.patch.object(
+                    timeline.transaction, 'on_commit', lambda func: func()):
+                follow.delete()
+        self.assertIsNone(
+            UserCounter.objects.get(user=self.author).pulled_since)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_follow_of_pulled_author_backfills(self):
+        """Подписка на подмешиваемого автора тоже заполняет ленту."""
+        post = Post.objects.create(author=self.author, text='Старый пост')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertIn(self.author.pk, timeline.pull_authors())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+
+    def test_follow_page_reads_timeline_index(self):
+        """Лента подписок листается по записям ленты, без соединения
+        с таблицей постов."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+            for number in range(12)
+        ]
+        client = Client()
+        client.force_login(self.reader)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('posts:follow_index'))
+        page_obj = response.context['page_obj']
+        self.assertEqual(
+            [post.pk for post in page_obj],
+            [post.pk for post in posts[:-11:-1]])
+        entry_queries = [
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "posts_timelineentry"' in query['sql']]
+        self.assertEqual(len(entry_queries), 1)
+        self.assertNotIn('posts_post', entry_queries[0])
+        response = client.get(reverse('posts:follow_index'), {
+            'cursor': page_obj.paginator.next_cursor})
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [posts[1].pk, posts[0].pk])
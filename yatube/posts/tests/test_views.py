@@ -1,9 +1,18 @@
+import base64
+import threading
+import time
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django import forms
+from django.test.utils import CaptureQueriesContext
 
-from posts.models import Post, Group, Follow
+from posts import feed_cache
+from posts.models import Comment, Post, Group, Follow
 
 User = get_user_model()
 
@@ -248,3 +257,181 @@ class PaginatorViewsTest(TestCase):
                 page + '?page=2')
             self.assertEqual(len(response_first_page.context['page_obj']), 10)
             self.assertEqual(len(response_second_page.context['page_obj']), 3)
+
+    def test_cursor_pages(self):
+        """Курсоры ведут на следующую и предыдущую страницы."""
+        url = reverse('posts:index')
+        first_page = PaginatorViewsTest.authorized_client.get(url)
+        paginator = first_page.context['page_obj'].paginator
+        self.assertIsNone(paginator.previous_cursor)
+        second_page = PaginatorViewsTest.authorized_client.get(
+            url, {'cursor': paginator.next_cursor})
+        second_page_obj = second_page.context['page_obj']
+        self.assertEqual(len(second_page_obj), 3)
+        self.assertFalse(second_page_obj.has_next())
+        self.assertTrue(second_page_obj.has_previous())
+        back_page = PaginatorViewsTest.authorized_client.get(
+            url, {'cursor': second_page_obj.paginator.previous_cursor})
+        self.assertEqual(
+            list(back_page.context['page_obj']),
+            list(first_page.context['page_obj'])
+        )
+
+    def test_cursor_page_does_not_count(self):
+        """Страница по курсору не выполняет COUNT(*)."""
+        with CaptureQueriesContext(connection) as queries:
+            PaginatorViewsTest.authorized_client.get(reverse(
+                'posts:group_posts',
+                kwargs={'slug': PaginatorViewsTest.group.slug}
+            ))
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_broken_cursor_opens_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = PaginatorViewsTest.authorized_client.get(
+            reverse('posts:index'), {'cursor': 'broken'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_cursor_with_wrong_values_opens_first_page(self):
+        """Курсор с пустыми или чужими значениями не ломает страницу."""
+        for payload in ('["n", 2, [null, null]]', '["n", "2", [1, 2]]',
+                        '["n", 2, [[1], {}]]', '["n", 2, "ab"]'):
+            cursor = base64.urlsafe_b64encode(
+                payload.encode()).decode().rstrip('=')
+            with self.subTest(payload=payload):
+                response = PaginatorViewsTest.authorized_client.get(
+                    reverse('posts:index'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    len(response.context['page_obj']), 10)
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Mikhail')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {n}')
+            for n in range(25)
+        )
+
+    def test_first_page_inline_and_next_page_fragment(self):
+        """Первая страница комментариев на странице поста, следующая —
+        во фрагменте по курсору."""
+        client = Client()
+        response = client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 20)
+        cursor = comments.paginator.next_cursor
+        fragment_url = reverse(
+            'posts:post_comments', kwargs={'post_id': self.post.id})
+        self.assertContains(response, f'{fragment_url}?cursor={cursor}')
+        with CaptureQueriesContext(connection) as queries:
+            fragment = client.get(fragment_url, {'cursor': cursor})
+        self.assertEqual(len(fragment.context['comments']), 5)
+        self.assertNotContains(fragment, 'data-comments-more')
+        self.assertNotContains(fragment, '<html>')
+        # Пост и страница комментариев вместе с авторами.
+        self.assertEqual(len(queries), 2)
+        shown = {comment.pk for comment in comments}
+        shown |= {comment.pk for comment in fragment.context['comments']}
+        self.assertEqual(len(shown), 25)
+
+
+@override_settings(NEW_POSTS_ENABLED=True)
+class NewPostsTests(TestCase):
+    """Запрос новых постов читает только счетчики лент в кэше."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Mikhail')
+        cls.author = User.objects.create_user(username='Author_Mikhail')
+        cls.other = User.objects.create_user(username='Other')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.client_user = Client()
+        cls.client_user.force_login(cls.user)
+        cls.url = reverse('posts:new_posts')
+
+    def setUp(self):
+        cache.clear()
+
+    def poll(self, client, feed, since, wait=0):
+        return client.get(
+            self.url, {'feed': feed, 'since': since, 'wait': wait}).json()
+
+    def since(self, client, url):
+        return client.get(url).context['new_posts_since']
+
+    def test_counts_new_posts_of_feed(self):
+        since = self.since(self.client_user, reverse('posts:follow_index'))
+        index_since = self.since(Client(), reverse('posts:index'))
+        Post.objects.create(author=self.author, text='Подписка')
+        Post.objects.create(author=self.other, text='Чужой автор')
+        self.assertEqual(
+            self.poll(self.client_user, 'follow', since)['count'], 1)
+        data = self.poll(Client(), 'index', index_since)
+        self.assertEqual(data['count'], 2)
+        with CaptureQueriesContext(connection) as queries:
+            self.poll(Client(), 'index', data['since'])
+        self.assertEqual(len(queries), 0)
+
+    def test_waits_for_new_post(self):
+        """Без новых постов запрос ждет, пока пост не появится."""
+        since = self.poll(Client(), 'index', '')['since']
+        timer = threading.Timer(
+            0.3, feed_cache.count_post,
+            [Post(author=self.author, text='Новый')])
+        timer.start()
+        started = time.monotonic()
+        data = self.poll(Client(), 'index', since, wait=5)
+        timer.join()
+        self.assertEqual(data['count'], 1)
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_follow_feed_requires_login(self):
+        response = Client().get(self.url, {'feed': 'follow', 'since': 0})
+        self.assertEqual(response.status_code, 403)
+
+    def test_new_subscription_rebases_counter(self):
+        """Подписка на автора не выдает его старые посты за новые."""
+        Post.objects.create(author=self.other, text='Старый пост')
+        since = self.since(self.client_user, reverse('posts:follow_index'))
+        Follow.objects.create(user=self.user, author=self.other)
+        data = self.poll(self.client_user, 'follow', since)
+        self.assertEqual(data['count'], 0)
+        Post.objects.create(author=self.other, text='Новый пост')
+        data = self.poll(self.client_user, 'follow', data['since'])
+        self.assertEqual(data['count'], 1)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_follow_poll_reads_few_counters(self):
+        """Лента подписок опрашивает счетчик читателя и профили только
+        подмешиваемых авторов, а не всех, на кого он подписан."""
+        Follow.objects.bulk_create(
+            Follow(user=self.user,
+                   author=User.objects.create_user(username=f'author_{n}'))
+            for n in range(5))
+        Follow.objects.create(user=self.user, author=self.other)
+        since = self.since(self.client_user, reverse('posts:follow_index'))
+        Post.objects.create(author=self.author, text='Разложенный пост')
+        Post.objects.create(author=self.other, text='Подмешиваемый пост')
+        with mock.patch.object(
+                feed_cache.cache, 'get_many',
+                wraps=feed_cache.cache.get_many) as get_many:
+            data = self.poll(self.client_user, 'follow', since)
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(len(get_many.call_args[0][0]), 2)
+
+    @override_settings(NEW_POSTS_ENABLED=False)
+    def test_disabled_without_shared_cache(self):
+        """Без общего кэша баннера нет, а запрос новых постов дает 404."""
+        response = Client().get(reverse('posts:index'))
+        self.assertIsNone(response.context['new_posts_since'])
+        self.assertNotContains(response, 'id="new-posts"')
+        response = Client().get(self.url, {'feed': 'index', 'since': ''})
+        self.assertEqual(response.status_code, 404)
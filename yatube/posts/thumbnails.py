@@ -0,0 +1,218 @@
+"""Заблаговременная генерация миниатюр картинок постов.
+
+Миниатюры всех размеров, которые используют шаблоны, создаются в фоновом
+пуле потоков сразу после загрузки картинки, а не при первой отрисовке
+ленты. Пока миниатюра не готова, шаблоны показывают заглушку того же
+размера. Адреса и размеры готовых миниатюр лежат в PostThumbnail
+и подгружаются вместе со страницей ленты одним запросом.
+
+Если часть миниатюр создать не удалось, повторная попытка делается не
+раньше, чем через RETRY_TIMEOUT секунд, и каждый следующий раз вдвое
+позже (до RETRY_MAX_TIMEOUT). Повтор создает только недостающие размеры.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from sorl.thumbnail import get_thumbnail
+
+from core import db_router
+from . import feed_cache
+from .models import PostThumbnail
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZES = {
+    'feed': ('960x339', {'crop': 'center'}),
+    'feed_720': ('720x254', {'crop': 'center'}),
+    'feed_480': ('480x170', {'crop': 'center'}),
+    # Варианты WebP весят заметно меньше JPEG того же качества.
+    'feed_webp': ('960x339', {'crop': 'center', 'format': 'WEBP'}),
+    'feed_720_webp': ('720x254', {'crop': 'center', 'format': 'WEBP'}),
+    'feed_480_webp': ('480x170', {'crop': 'center', 'format': 'WEBP'}),
+}
+# Миниатюры ленты для srcset от узкой к широкой: JPEG и WebP.
+FEED_SRCSET = ('feed_480', 'feed_720', 'feed')
+FEED_WEBP_SRCSET = ('feed_480_webp', 'feed_720_webp', 'feed_webp')
+# Ширина картинки в ленте: во всю ширину экрана на телефонах,
+# не больше колонки контента на остальных.
+FEED_SIZES = '(max-width: 992px) 100vw, 960px'
+PENDING_KEY = 'thumbnail-pending:{}'
+PENDING_TIMEOUT = 60
+# Неудачные попытки: (число попыток, время следующей попытки).
+FAILED_KEY = 'thumbnail-failed:{}'
+FAILED_TIMEOUT = 60 * 60 * 24 * 7
+RETRY_TIMEOUT = 60
+RETRY_MAX_TIMEOUT = 60 * 60 * 24
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def generate(name, skip=()):
+    """Создает миниатюры всех размеров для картинки name, кроме skip.
+
+    Возвращает словарь {размер: {'url', 'width', 'height'}} только для
+    миниатюр, которые удалось создать.
+    """
+    generated = {}
+    for alias, (geometry, options) in THUMBNAIL_SIZES.items():
+        if alias in skip:
+            continue
+        try:
+            thumbnail = get_thumbnail(name, geometry, **options)
+            if not thumbnail.exists():
+                continue
+            generated[alias] = {
+                'url': thumbnail.url,
+                'width': thumbnail.width,
+                'height': thumbnail.height,
+            }
+        except Exception:
+            logger.exception('Не удалось создать миниатюру %s', name)
+    return generated
+
+
+def remember(post_ids, name, generated):
+    """Сохраняет миниатюры картинки name для постов post_ids."""
+    PostThumbnail.objects.filter(post_id__in=post_ids).exclude(
+        source=name).delete()
+    PostThumbnail.objects.bulk_create([
+        PostThumbnail(post_id=post_id, alias=alias, source=name, **data)
+        for post_id in post_ids
+        for alias, data in generated.items()
+    ], ignore_conflicts=True)
+
+
+def failed(name):
+    """Идет ли пауза после неудачной попытки создать миниатюры name."""
+    attempt = cache.get(FAILED_KEY.format(name))
+    return attempt is not None and attempt[1] > time.time()
+
+
+def _record_attempt(name, complete):
+    key = FAILED_KEY.format(name)
+    if complete:
+        cache.delete(key)
+        return
+    attempts = (cache.get(key) or (0, 0))[0] + 1
+    delay = min(RETRY_TIMEOUT * 2 ** (attempts - 1), RETRY_MAX_TIMEOUT)
+    cache.set(key, (attempts, time.time() + delay), FAILED_TIMEOUT)
+
+
+def _generate(post_id, name, feeds):
+    try:
+        ready = set(PostThumbnail.objects.filter(
+            post_id=post_id, source=name).values_list('alias', flat=True))
+        generated = generate(name, skip=ready)
+        remember([post_id], name, generated)
+        _record_attempt(name, ready.union(generated) >= set(THUMBNAIL_SIZES))
+        if generated:
+            # В закэшированных лентах пока лежит заглушка.
+            feed_cache.bump(*feeds)
+    except Exception:
+        _record_attempt(name, False)
+        logger.exception('Не удалось сохранить миниатюры %s', name)
+
+
+def _generate_in_background(post_id, name, feeds):
+    try:
+        _generate(post_id, name, feeds)
+    finally:
+        cache.delete(PENDING_KEY.format(name))
+        # Поток пула держит собственное соединение с БД.
+        connection.close()
+
+
+def schedule(image):
+    """Ставит картинку поста в очередь на генерацию после фиксации
+    транзакции."""
+    if not image:
+        return
+    name = image.name
+    if failed(name):
+        return
+    post = image.instance
+    feeds = feed_cache.post_feeds(post)
+    if cache.add(PENDING_KEY.format(name), True, PENDING_TIMEOUT):
+        transaction.on_commit(lambda: _submit(post.pk, name, feeds))
+
+
+def _submit(post_id, name, feeds):
+    # SQLite допускает одного писателя: запись из фонового потока
+    # конфликтует с запросом, поэтому миниатюры создаются сразу.
+    if not settings.THUMBNAIL_WORKERS or connection.vendor == 'sqlite':
+        # Запись идет и из читающих представлений; посетитель ее не ждет,
+        # поэтому основная база за ним не закрепляется.
+        with db_router.without_pinning():
+            _generate(post_id, name, feeds)
+        cache.delete(PENDING_KEY.format(name))
+    else:
+        get_executor().submit(_generate_in_background, post_id, name, feeds)
+
+
+def placeholder(alias):
+    width, height = THUMBNAIL_SIZES[alias][0].split('x')
+    svg = (
+        f"<svg xmlns='http://www.w3.org/2000/svg' width='{width}' "
+        f"height='{height}'><rect width='100%' height='100%' "
+        "fill='#e9ecef'/></svg>"
+    )
+    return {
+        'url': 'data:image/svg+xml,' + quote(svg),
+        'width': int(width),
+        'height': int(height),
+        'placeholder': True,
+    }
+
+
+def _srcset(ready, aliases):
+    candidates = {}
+    for alias in aliases:
+        thumbnail = ready.get(alias)
+        # Без увеличения маленький исходник дает одинаковые миниатюры.
+        if thumbnail is not None:
+            candidates.setdefault(thumbnail.width, thumbnail.url)
+    return ', '.join(
+        f'{url} {width}w' for width, url in sorted(candidates.items()))
+
+
+def responsive(image, alias='feed'):
+    """Миниатюра для тега img с наборами srcset в JPEG и WebP.
+
+    Пока основная миниатюра не готова, возвращает заглушку ее размера.
+    Недостающие ширины ставятся в очередь на генерацию, а srcset
+    собирается из готовых.
+    """
+    ready = {
+        thumbnail.alias: thumbnail
+        for thumbnail in image.instance.thumbnails.all()
+        if thumbnail.source == image.name
+    }
+    if any(name not in ready
+           for name in FEED_SRCSET + FEED_WEBP_SRCSET):
+        schedule(image)
+    main = ready.get(alias)
+    if main is None:
+        return placeholder(alias)
+    return {
+        'url': main.url,
+        'width': main.width,
+        'height': main.height,
+        'srcset': _srcset(ready, FEED_SRCSET),
+        'webp_srcset': _srcset(ready, FEED_WEBP_SRCSET),
+        'sizes': FEED_SIZES,
+    }
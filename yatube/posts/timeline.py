@@ -0,0 +1,198 @@
+"""Домашняя лента подписок, материализованная при записи.
+
+Новый пост раскладывается в ленты подписчиков автора. Для авторов
+с очень большим числом подписчиков раскладка не выполняется: их посты
+подмешиваются в ленту при чтении (гибридная схема), чтобы одна запись
+не превращалась в миллионы строк.
+
+Когда число подписчиков автора пересекает TIMELINE_FANOUT_LIMIT,
+reconcile переводит его между схемами (UserCounter.pulled_since): после
+возврата к раскладке посты, опубликованные без нее, дописываются
+в ленты подписчиков.
+
+Лента без подмешиваемых авторов листается по записям ленты в порядке
+индекса (user, -pub_date, -post), а посты страницы загружаются одним
+запросом по списку id.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import feed_cache
+from .models import Follow, Post, TimelineEntry, UserCounter
+from .paginator import paginate
+
+BATCH_SIZE = 1000
+PULL_AUTHORS_KEY = 'timeline:pull_authors'
+PULL_AUTHORS_TIMEOUT = 300
+# Совпадает с индексом timeline_user_pub_date_idx.
+TIMELINE_ORDERING = ('-pub_date', '-post_id')
+
+
+def pull_authors():
+    """Возвращает множество авторов, чьи посты читаются без раскладки."""
+    authors = cache.get(PULL_AUTHORS_KEY)
+    if authors is None:
+        authors = set(UserCounter.objects.filter(
+            pulled_since__isnull=False
+        ).values_list('user_id', flat=True))
+        cache.set(PULL_AUTHORS_KEY, authors, PULL_AUTHORS_TIMEOUT)
+    return authors
+
+
+def reconcile(author_id):
+    """Переводит автора между раскладкой и чтением при пересечении порога.
+
+    Вызывается сигналами после изменения числа подписчиков.
+    """
+    counter = UserCounter.objects.filter(user_id=author_id).values(
+        'followers_count', 'pulled_since').first()
+    if counter is None:
+        return
+    pulled = counter['followers_count'] >= settings.TIMELINE_FANOUT_LIMIT
+    pulled_since = counter['pulled_since']
+    if pulled == (pulled_since is not None):
+        return
+    # Условие на прежнее значение не дает двум процессам перевести
+    # автора дважды.
+    changed = UserCounter.objects.filter(
+        user_id=author_id, pulled_since=pulled_since
+    ).update(pulled_since=timezone.now() if pulled else None)
+    if not changed:
+        return
+    cache.delete(PULL_AUTHORS_KEY)
+    if not pulled:
+        transaction.on_commit(lambda: refill(author_id, pulled_since))
+
+
+def reconcile_all():
+    """Сверяет схему всех авторов с числом подписчиков (rebuild_counters)."""
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    authors = UserCounter.objects.filter(
+        Q(followers_count__gte=limit, pulled_since__isnull=True)
+        | Q(followers_count__lt=limit, pulled_since__isnull=False)
+    ).values_list('user_id', flat=True)
+    for author_id in list(authors):
+        reconcile(author_id)
+
+
+def refill(author_id, since):
+    """Дописывает подписчикам посты автора, опубликованные без раскладки."""
+    posts = list(Post.objects.filter(
+        author_id=author_id, pub_date__gte=since
+    ).order_by('-pub_date').values_list(
+        'id', 'pub_date')[:settings.TIMELINE_BACKFILL_LIMIT])
+    if not posts:
+        return
+    followers = Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+    _bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for user_id in followers.iterator()
+        for post_id, pub_date in posts
+    )
+
+
+def _bulk_insert(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Кладет новый пост в ленты всех подписчиков автора.
+
+    Число подписчиков не больше TIMELINE_FANOUT_LIMIT, поэтому их список
+    читается целиком: по нему же увеличиваются счетчики новых постов
+    их лент.
+    """
+    if post.author_id in pull_authors():
+        return
+    followers = list(Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True))
+    _bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post.id,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in followers
+    )
+    feed_cache.count_posts(
+        *(feed_cache.timeline_feed(user_id) for user_id in followers))
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика последние посты нового автора.
+
+    Выполняется и для подмешиваемых авторов: если автор вернется
+    к раскладке, его прежние посты уже будут в ленте.
+    """
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date'
+    ).values_list('id', 'pub_date')[:settings.TIMELINE_BACKFILL_LIMIT]
+    _bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts
+    )
+
+
+def remove(user_id, author_id):
+    """Убирает из ленты подписчика посты автора после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def feed(user):
+    """Возвращает посты ленты подписок пользователя запросом к постам."""
+    pulled = pull_authors()
+    if pulled:
+        pulled = list(Follow.objects.filter(
+            user=user, author_id__in=pulled
+        ).values_list('author_id', flat=True))
+    if not pulled:
+        return Post.objects.for_feed().filter(timeline_entries__user=user)
+    materialized = TimelineEntry.objects.filter(user=user).values('post_id')
+    return Post.objects.for_feed().filter(
+        Q(pk__in=materialized) | Q(author_id__in=pulled)
+    )
+
+
+def _posts(entries):
+    ids = [entry.post_id for entry in entries]
+    posts = Post.objects.for_feed().in_bulk(ids)
+    return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+def page(request, user):
+    """Страница ленты подписок для запроса.
+
+    Если пользователь подписан на подмешиваемых авторов, лента строится
+    запросом к постам (feed), иначе листаются записи ленты по индексу.
+    """
+    pulled = pull_authors()
+    if pulled and Follow.objects.filter(
+            user=user, author_id__in=pulled).exists():
+        return paginate(request, feed(user))
+    entries = TimelineEntry.objects.filter(user=user).only(
+        'post_id', 'pub_date')
+    return paginate(
+        request, entries, ordering=TIMELINE_ORDERING, resolve=_posts)
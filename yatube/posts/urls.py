@@ -10,12 +10,25 @@ urlpatterns = [
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='create'),
+    path('posts/new/', views.new_posts, name='new_posts'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path(
         'posts/<int:post_id>/comment/',
         views.add_comment,
         name='add_comment'
     ),
+    path('search/', views.post_search, name='search'),
+    path(
+        'images/<str:signature>/<int:width>/<str:crop>/<str:fmt>/'
+        '<path:name>',
+        views.image_resize,
+        name='image_resize'
+    ),
     path('follow/', views.follow_index, name='follow_index'),
     path(
         'profile/<str:username>/follow/',
@@ -0,0 +1,169 @@
+"""Счетчики просмотров постов с отложенной записью в базу.
+
+Просмотр только увеличивает счетчик в памяти процесса, без запроса
+к базе: UPDATE на каждый просмотр выстраивал бы запросы популярного поста
+в очередь за блокировкой его строки. Накопленные приращения раз
+в POST_VIEWS_FLUSH_INTERVAL секунд записывает фоновый поток одним
+запросом (``views_count = views_count + CASE ...``), поэтому записи разных
+процессов складываются, а не затирают друг друга. На SQLite запись из
+фонового потока конфликтовала бы с запросами, поэтому там счетчики
+сбрасывает первый просмотр после истечения интервала.
+
+Если запись не удалась, незаписанные приращения возвращаются в память
+и уйдут со следующей. При остановке процесса несохраненное записывается через
+atexit; при аварийном падении теряется не больше одного интервала.
+
+После записи версия ленты просмотров поста увеличивается, чтобы страница
+поста в кэше и ее ETag показали новое число.
+"""
+import atexit
+import collections
+import logging
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+
+from . import feed_cache
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# SQLite принимает не больше 999 параметров, на пост их уходит три.
+BATCH_SIZE = 300
+
+_pending = collections.Counter()
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_last_flush = time.monotonic()
+_flusher = None
+
+
+def _flushes_in_background():
+    return connections[DEFAULT_DB_ALIAS].vendor != 'sqlite'
+
+
+def _start_flusher():
+    global _flusher
+    with _lock:
+        if _flusher is not None and _flusher.is_alive():
+            return
+        _flusher = threading.Thread(
+            target=_flush_periodically, name='view-counts', daemon=True)
+        _flusher.start()
+
+
+def _flush_periodically():
+    while True:
+        time.sleep(settings.POST_VIEWS_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception:
+            logger.exception('Не удалось сбросить просмотры постов')
+        finally:
+            # Поток держит собственное соединение с БД.
+            connections.close_all()
+
+
+def record(post_id):
+    """Учитывает просмотр поста."""
+    global _last_flush
+    if _flushes_in_background():
+        _start_flusher()
+        with _lock:
+            _pending[post_id] += 1
+        return
+    with _lock:
+        _pending[post_id] += 1
+        due = (time.monotonic() - _last_flush
+               >= settings.POST_VIEWS_FLUSH_INTERVAL)
+        if due:
+            _last_flush = time.monotonic()
+    # Внутри чужой транзакции запись откатилась бы вместе с ней.
+    if due and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        flush()
+
+
+def reset():
+    """Забывает незаписанные просмотры, не записывая их."""
+    global _last_flush
+    with _lock:
+        _pending.clear()
+        _last_flush = time.monotonic()
+
+
+def pending(post_id):
+    """Просмотры поста, еще не записанные в базу этим процессом."""
+    with _lock:
+        return _pending.get(post_id, 0)
+
+
+def count(post):
+    """Приблизительное число просмотров без запроса к базе."""
+    return post.views_count + pending(post.pk)
+
+
+def flush():
+    """Записывает накопленные просмотры в базу, возвращает число постов."""
+    global _pending
+    with _flush_lock:
+        with _lock:
+            deltas, _pending = _pending, collections.Counter()
+        items = list(deltas.items())
+        written = 0
+        for start in range(0, len(items), BATCH_SIZE):
+            try:
+                _write(items[start:start + BATCH_SIZE])
+            except Exception:
+                logger.exception('Не удалось записать просмотры постов')
+                # Незаписанные приращения вернутся со следующей записью.
+                with _lock:
+                    _pending.update(dict(items[start:]))
+                break
+            written = min(start + BATCH_SIZE, len(items))
+        if written:
+            feed_cache.bump(*(
+                feed_cache.views_feed(post_id)
+                for post_id, _ in items[:written]))
+    return written
+
+
+def _write(items):
+    # Запись всегда идет в основную базу напрямую, минуя роутер: иначе
+    # читатель, на запросе которого сработал сброс, закрепился бы за ней.
+    Post.objects.using(DEFAULT_DB_ALIAS).filter(
+        pk__in=[post_id for post_id, _ in items]
+    ).update(views_count=F('views_count') + Case(
+        *[When(pk=post_id, then=Value(delta)) for post_id, delta in items],
+        default=Value(0),
+        output_field=PositiveIntegerField(),
+    ))
+
+
+def counts_views(view):
+    """Декоратор страницы поста: учитывает просмотр и ответ 304.
+
+    Номер поста запоминается в ответе, чтобы просмотр учитывался и тогда,
+    когда гостю отдается закэшированная копия страницы (record_cached).
+    """
+    @wraps(view)
+    def wrapper(request, post_id, *args, **kwargs):
+        response = view(request, post_id, *args, **kwargs)
+        if response.status_code in (200, 304):
+            record(post_id)
+            response.viewed_post_id = post_id
+        return response
+    return wrapper
+
+
+def record_cached(response):
+    """Учитывает просмотр поста, отданного из кэша страниц."""
+    post_id = getattr(response, 'viewed_post_id', None)
+    if post_id is not None:
+        record(post_id)
+
+
+atexit.register(flush)
@@ -1,69 +1,158 @@
-from django.core.paginator import Paginator
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.http import FileResponse, Http404, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.cache import never_cache
+
+from core.db.pool import release_connections
+from core.db_router import read_from_replica
 
-from .models import Post, Group, User, Follow
+from . import (feed_cache, follows, resize, search, thumbnails, timeline,
+               view_counts)
+from .conditional import feed_condition
+from .models import Comment, Follow, Group, Post, User
 from .forms import PostForm, CommentForm
+from .paginator import (COMMENT_ORDERING, COMMENTS_PER_PAGE,
+                        CursorPaginator, paginate)
+
+
+def _index_feeds():
+    return [feed_cache.index_feed()]
+
+
+def _follow_feeds(user):
+    # Новые посты разложенных авторов считает счетчик ленты читателя,
+    # а подмешиваемых — счетчики их профилей.
+    pulled = timeline.pull_authors()
+    return [feed_cache.timeline_feed(user.pk)] + [
+        feed_cache.profile_feed(author_id)
+        for author_id in follows.followed_authors(user.pk)
+        if author_id in pulled
+    ]
+
+
+def _new_posts_since(feeds):
+    if not settings.NEW_POSTS_ENABLED:
+        return None
+    return feed_cache.posts_cursor(feeds)
 
 
+def _group_feeds(slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True).first()
+    return None if group_id is None else [feed_cache.group_feed(group_id)]
+
+
+def _profile_feeds(username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+    return None if author_id is None else [feed_cache.profile_feed(author_id)]
+
+
+def _post_feeds(post_id):
+    # Рядом с постом показаны число постов автора из его профиля
+    # и число просмотров.
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True).first()
+    if author_id is None:
+        return None
+    return [
+        feed_cache.post_feed(post_id),
+        feed_cache.profile_feed(author_id),
+        feed_cache.views_feed(post_id),
+    ]
+
+
+@read_from_replica
+@feed_condition(_index_feeds)
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    page_obj = paginate(request, post_list)
     title = 'Последние обновления на сайте'
     context = {
         'page_obj': page_obj,
         'title': title,
+        'new_posts_since': _new_posts_since(_index_feeds()),
+        **feed_cache.cache_context(feed_cache.index_feed()),
     }
     return render(request, 'posts/index.html', context)
 
 
+@read_from_replica
+@feed_condition(_group_feeds)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    group_list = group.posts.all()
-    paginator = Paginator(group_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    group_list = group.posts.for_feed()
+    page_obj = paginate(request, group_list)
     title = slug
     context = {
         'title': title,
         'group': group,
         'page_obj': page_obj,
+        **feed_cache.cache_context(feed_cache.group_feed(group.pk)),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@read_from_replica
+@feed_condition(_profile_feeds)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username)
+    posts = author.posts.for_feed()
+    page_obj = paginate(request, posts)
     following = False
     if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user.id, author=author.id).exists()
+        following = follows.is_following(request.user.id, author.id)
     context = {
         'author': author,
         'page_obj': page_obj,
-        'following': following
+        'following': following,
+        **feed_cache.cache_context(feed_cache.profile_feed(author.pk)),
     }
     return render(request, 'posts/profile.html', context)
 
 
+def comment_page(post_id, cursor=None):
+    """Страница комментариев поста, по умолчанию первая."""
+    paginator = CursorPaginator(
+        Comment.objects.for_post(post_id), COMMENTS_PER_PAGE,
+        ordering=COMMENT_ORDERING)
+    return paginator.get_page(cursor)
+
+
+@read_from_replica
+@view_counts.counts_views
+@feed_condition(_post_feeds)
 def post_detail(request, post_id):
-    post_detail = get_object_or_404(Post, id=post_id)
+    post_detail = get_object_or_404(Post.objects.for_detail(), id=post_id)
     form = CommentForm()
-    comments = post_detail.comments.all()
     context = {
         'post_detail': post_detail,
         'form': form,
-        'comments': comments,
+        'post_id': post_detail.pk,
+        'comments': comment_page(post_detail.pk),
+        'views_count': view_counts.count(post_detail),
+        **feed_cache.cache_context(feed_cache.post_feed(post_detail.pk)),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@read_from_replica
+def post_comments(request, post_id):
+    """Фрагмент со следующей страницей комментариев."""
+    post_id = get_object_or_404(Post.objects.only('id'), id=post_id).pk
+    context = {
+        'post_id': post_id,
+        'comments': comment_page(post_id, request.GET.get('cursor')),
+        **feed_cache.cache_context(feed_cache.post_feed(post_id)),
+    }
+    return render(request, 'includes/comment_list.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -71,6 +160,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.schedule(post.image)
         return redirect('posts:profile', post.author)
     context = {
         'form': form,
@@ -87,7 +177,12 @@ def post_edit(request, post_id):
                     files=request.FILES or None,
                     instance=post)
     if form.is_valid():
-        form.save()
+        post = form.save(commit=False)
+        # Счетчики поста, загруженные в начале правки, могли устареть:
+        # сохраняются только поля формы.
+        post.save(update_fields=form.Meta.fields)
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post.image)
         return redirect('posts:post_detail',
                         post_id=post_id)
     is_edit = True
@@ -111,18 +206,67 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    posts = search.search(query, Post.objects.for_feed())
+    page_obj = paginate(
+        request, posts.order_by(*search.SEARCH_ORDERING),
+        ordering=search.SEARCH_ORDERING)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'pagination_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@read_from_replica
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = timeline.page(request, request.user)
     context = {
         'page_obj': page_obj,
+        'new_posts_since': _new_posts_since(_follow_feeds(request.user)),
     }
     return render(request, 'posts/follow.html', context)
 
 
+@never_cache
+def new_posts(request):
+    """Сколько постов появилось в ленте после значения счетчика since.
+
+    Если новых постов нет, запрос ждет их до wait секунд (не больше
+    NEW_POSTS_MAX_WAIT). Читаются только счетчики в кэше, поэтому
+    клиент может спрашивать часто, а ленту загружать, лишь когда
+    в ней что-то появилось. since — метка из posts_cursor; метка от
+    другого набора лент (подписки изменились) дает count 0 и новую метку.
+    """
+    if not settings.NEW_POSTS_ENABLED:
+        raise Http404
+    if request.GET.get('feed') == 'follow':
+        if not request.user.is_authenticated:
+            return JsonResponse({'since': None, 'count': 0}, status=403)
+        feeds = _follow_feeds(request.user)
+    else:
+        feeds = [feed_cache.index_feed()]
+    since = feed_cache.parse_posts_cursor(request.GET.get('since'), feeds)
+    try:
+        wait = min(max(int(request.GET.get('wait', 0)), 0),
+                   settings.NEW_POSTS_MAX_WAIT)
+    except ValueError:
+        wait = 0
+    if since is None:
+        wait = 0
+    if wait:
+        # Ожидание не должно занимать соединение с базой.
+        release_connections()
+    current = feed_cache.wait_for_posts(feeds, since, wait)
+    return JsonResponse({
+        'since': feed_cache.posts_cursor(feeds, current),
+        'count': 0 if since is None else max(current - since, 0),
+    })
+
+
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
@@ -142,3 +286,22 @@ def profile_unfollow(request, username):
         author=author
     ).delete()
     return redirect('posts:profile', username=username)
+
+
+def image_resize(request, signature, width, crop, fmt, name):
+    """Картинка поста нужной ширины по подписанному адресу."""
+    if (not resize.is_valid(width, crop, fmt)
+            or not resize.verify(signature, name, width, crop, fmt)):
+        raise Http404
+    output = resize.negotiate(fmt, request.META.get('HTTP_ACCEPT', ''))
+    try:
+        variant = resize.open_variant(name, width, crop, output)
+    except OSError:
+        raise Http404
+    response = FileResponse(
+        variant, content_type=resize.FORMATS[output][1])
+    patch_cache_control(
+        response, public=True, max_age=settings.RESIZE_MAX_AGE)
+    if fmt == resize.AUTO:
+        patch_vary_headers(response, ('Accept',))
+    return response
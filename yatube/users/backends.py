@@ -0,0 +1,29 @@
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+USER_KEY = 'user:{}'
+USER_TIMEOUT = 60 * 60
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который берет пользователя запроса из кэша.
+
+    Запись идет как обычно в базу, а копия в кэше удаляется сигналом при
+    любом сохранении пользователя (смена пароля, профиля, last_login),
+    или смене его групп и прав, поэтому хэш сессии и права всегда
+    совпадают с базой.
+    """
+
+    def get_user(self, user_id):
+        key = USER_KEY.format(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user, USER_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
+
+
+def forget_user(*user_ids):
+    cache.delete_many([USER_KEY.format(user_id) for user_id in user_ids])
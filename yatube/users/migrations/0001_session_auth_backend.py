@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.sessions.backends.cached_db import KEY_PREFIX
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import caches
+from django.db import migrations
+from django.utils import timezone
+
+MODEL_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+CACHED_BACKEND = 'users.backends.CachedModelBackend'
+BATCH_SIZE = 500
+
+
+def rewrite_backend(apps, old, new):
+    """Меняет путь бэкенда в живых сессиях с old на new.
+
+    Сессия хранит путь бэкенда, которым вошел пользователь, и Django
+    принимает ее, только если этот путь есть в AUTHENTICATION_BACKENDS.
+    Копии измененных сессий удаляются из кэша, чтобы cached_db
+    перечитал их из базы.
+    """
+    Session = apps.get_model('sessions', 'Session')
+    store = SessionStore()
+    sessions = Session.objects.filter(expire_date__gt=timezone.now())
+    changed = []
+    for session in sessions.iterator():
+        data = store.decode(session.session_data)
+        if data.get(BACKEND_SESSION_KEY) != old:
+            continue
+        data[BACKEND_SESSION_KEY] = new
+        session.session_data = store.encode(data)
+        changed.append(session)
+    Session.objects.bulk_update(
+        changed, ['session_data'], batch_size=BATCH_SIZE)
+    caches[settings.SESSION_CACHE_ALIAS].delete_many(
+        [KEY_PREFIX + session.session_key for session in changed])
+
+
+def forwards(apps, schema_editor):
+    rewrite_backend(apps, MODEL_BACKEND, CACHED_BACKEND)
+
+
+def backwards(apps, schema_editor):
+    rewrite_backend(apps, CACHED_BACKEND, MODEL_BACKEND)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sessions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete,
+                                      post_save)
+from django.dispatch import receiver
+
+from .backends import forget_user
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_user_permissions(sender, instance, action, reverse, pk_set,
+                                **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            forget_user(instance.pk)
+    elif action in ('post_add', 'post_remove'):
+        forget_user(*pk_set)
+    elif action == 'pre_clear':
+        # Группа или право очищается целиком: пользователей берем из связи,
+        # пока она еще есть.
+        related = {f'{instance._meta.model_name}_id': instance.pk}
+        forget_user(*sender.objects.filter(**related).values_list(
+            'user_id', flat=True))
@@ -30,25 +30,32 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'sorl.thumbnail',
-    'debug_toolbar',
 ]
 
 MIDDLEWARE = [
-    'django.middleware.csrf.CsrfViewMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'posts.middleware.AnonymousPageCacheMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+# Debug toolbar подключается только при DEBUG и DEBUG_TOOLBAR=1 в окружении.
+DEBUG_TOOLBAR = DEBUG and os.getenv('DEBUG_TOOLBAR') == '1'
+if DEBUG_TOOLBAR:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backend.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -65,17 +72,66 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Бэкенд core.db.postgresql держит в каждом процессе пул из DB_POOL_SIZE
+# соединений (по числу потоков воркера gunicorn) и возвращает соединение
+# в пул в конце запроса, поэтому CONN_MAX_AGE для него остается 0.
+# Соединение, пролежавшее без дела DB_POOL_CHECK_AFTER секунд, перед
+# выдачей проверяется запросом SELECT 1. Для стандартных бэкендов
+# DB_CONN_MAX_AGE оставляет соединение потока открытым между запросами.
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
+        'ENGINE': os.getenv('DB_ENGINE', 'core.db.postgresql'),
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT')
+        'PORT': os.getenv('DB_PORT'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
+        'POOL': {
+            'SIZE': int(os.getenv('DB_POOL_SIZE', 4)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 5)),
+            'CHECK_AFTER': float(os.getenv('DB_POOL_CHECK_AFTER', 30)),
+            'MAX_AGE': int(os.getenv('DB_POOL_MAX_AGE', 30 * 60)),
+        },
     }
 }
 
+# Реплики для чтения лент и постов, через запятую: хосты PostgreSQL
+# в DB_REPLICA_HOSTS или, для проверки на одной машине, имена баз
+# (файлов SQLite) в DB_REPLICA_NAMES. Остальные параметры берутся
+# у основной базы.
+DATABASE_REPLICAS = []
+_replicas = [
+    ('HOST', value) for value in os.getenv('DB_REPLICA_HOSTS', '').split(',')
+] + [
+    ('NAME', value) for value in os.getenv('DB_REPLICA_NAMES', '').split(',')
+]
+for _field, _value in _replicas:
+    if _value.strip():
+        _alias = f'replica_{len(DATABASE_REPLICAS) + 1}'
+        DATABASES[_alias] = {
+            **DATABASES['default'],
+            _field: _value.strip(),
+            'TEST': {'MIRROR': 'default'},
+        }
+        DATABASE_REPLICAS.append(_alias)
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+# Сколько секунд после записи посетитель читает из основной базы.
+REPLICA_PIN_SECONDS = 10
+# Наибольшее ожидаемое отставание реплик: столько секунд после изменения
+# ленты ее читают из основной базы, чтобы не закэшировать старые данные.
+REPLICA_LAG_SECONDS = REPLICA_PIN_SECONDS
+
+# Пользователь запроса берется из кэша. Второй ModelBackend не нужен:
+# с ним неудачный вход проверял бы пароль дважды. Сессии, открытые через
+# ModelBackend, переводит на этот бэкенд миграция users 0001.
+AUTHENTICATION_BACKENDS = [
+    'users.backends.CachedModelBackend',
+]
+
+# Сессия читается из кэша, а пишется и в кэш, и в базу.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -111,15 +167,79 @@ LOGIN_REDIRECT_URL = 'posts:index'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+# Токен форм на кэшируемых страницах запрашивается скриптом с /csrf/,
+# чтобы HTML страниц не зависел от посетителя.
+CSRF_TOKEN_DEFERRED = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-
+# Загруженные картинки постов уменьшаются до IMAGE_MAX_SIDE пикселей по
+# большей стороне и пересохраняются в JPEG с качеством IMAGE_JPEG_QUALITY.
+IMAGE_MAX_SIDE = 2048
+IMAGE_JPEG_QUALITY = 85
+# Загрузки больше этого размера пишутся во временный файл, а не в память.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+# Дисковый кэш картинок, уменьшенных по запросу (/images/...), и срок
+# их хранения в браузерах и CDN.
+RESIZE_CACHE_DIR = os.getenv(
+    'RESIZE_CACHE_DIR', os.path.join(BASE_DIR, 'resize_cache'))
+RESIZE_CACHE_MAX_BYTES = int(
+    os.getenv('RESIZE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+RESIZE_MAX_AGE = 60 * 60 * 24 * 30
+
+# Общий для всех процессов кэш выбирается через окружение, например
+# CACHE_BACKEND=core.redis_cache.RedisCache
+# CACHE_LOCATION=redis://127.0.0.1:6379/0
+# или CACHE_BACKEND=django.core.cache.backends.memcached.MemcachedCache
+# CACHE_LOCATION=127.0.0.1:11211
+# Обертка MeteredCache считает попадания в кэш для /metrics/.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.metrics.MeteredCache',
+        'METERED_BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+        'KEY_PREFIX': os.getenv('CACHE_KEY_PREFIX', ''),
     }
 }
 
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+# Токен для /metrics/: Prometheus передает его в заголовке
+# Authorization: Bearer <токен>. Без токена метрики закрыты.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Авторы с таким числом подписчиков не раскладываются по лентам,
+# их посты подмешиваются в ленту подписок при чтении.
+TIMELINE_FANOUT_LIMIT = 10000
+# Сколько последних постов автора попадает в ленту при подписке.
+TIMELINE_BACKFILL_LIMIT = 1000
+# Срок жизни закэшированных фрагментов лент. Изменения постов, комментариев
+# и групп сбрасывают кэш сразу через версии лент.
+FEED_CACHE_TIMEOUT = 60 * 10
+# Срок жизни отрисованных карточек постов. Ключ карточки меняется вместе
+# с ее содержимым, поэтому срок ограничивает только объем кэша.
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Сколько секунд запрос новых постов ждет изменений в ленте и как часто
+# он проверяет счетчик в кэше.
+NEW_POSTS_MAX_WAIT = 20
+NEW_POSTS_POLL_INTERVAL = 0.5
+# Счетчики новых постов должны быть общими для всех процессов. В кэше
+# в памяти процесса у каждого воркера свои значения, поэтому с ним
+# баннер новых постов выключен.
+NEW_POSTS_ENABLED = CACHES['default']['METERED_BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+# Как часто процесс записывает накопленные просмотры постов в базу.
+POST_VIEWS_FLUSH_INTERVAL = 10
+# Сколько хранятся целые страницы для гостей; устаревшие по версиям лент
+# копии не отдаются и раньше.
+PAGE_CACHE_TIMEOUT = 60 * 10
+# Сколько общий кэш перед сайтом (nginx, CDN) может отдавать страницу
+# гостю без перепроверки.
+PAGE_SHARED_MAX_AGE = 10
+# Число фоновых потоков на процесс, создающих миниатюры после загрузки.
+# При 0 (и всегда на SQLite) миниатюры создаются сразу после сохранения.
+THUMBNAIL_WORKERS = 2
@@ -3,6 +3,8 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import csrf_token_view, metrics_view
+
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
     path('group_list/<slug:slug>/', include('posts.urls')),
@@ -10,15 +12,19 @@ urlpatterns = [
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('metrics/', metrics_view, name='metrics'),
+    path('csrf/', csrf_token_view, name='csrf_token'),
 ]
 
 handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.permission_denied_view'
 handler500 = 'core.views.server_error'
 
-if settings.DEBUG:
+if settings.DEBUG_TOOLBAR:
     import debug_toolbar
     urlpatterns += (path('__debug__/', include(debug_toolbar.urls)),)
+
+if settings.DEBUG:
     urlpatterns += static(
         settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
     )